@@ -68,12 +68,14 @@ def click(screen: pygame.Surface, event: pygame.event.Event):
 def next_gen(screen: pygame.Surface) -> List[pygame.rect.Rect]:
     """Evolve the board to the next generation."""
 
-    _APL.eval("next_board ← ⊃1 board∨.∧3 4=+⌿+⌿¯1 0 1∘.⊖¯1 0 1∘.⌽⊂board")
-    new_alive = _APL.eval("⍸new_alive ← next_board∧diff←board≠next_board")
+    _, new_alive, new_dead, _ = _APL.eval_many([
+        "next_board ← ⊃1 board∨.∧3 4=+⌿+⌿¯1 0 1∘.⊖¯1 0 1∘.⌽⊂board",
+        "⍸new_alive ← next_board∧diff←board≠next_board",
+        "⍸diff∧~new_alive",
+        "board ← next_board",
+    ])
     alive_rects = paint(screen, new_alive, True)
-    new_dead = _APL.eval("⍸diff∧~new_alive")
     dead_rects = paint(screen, new_dead, False)
-    _APL.eval("board ← next_board")
     return alive_rects + dead_rects
 
 
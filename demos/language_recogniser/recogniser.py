@@ -51,18 +51,21 @@ def init_data(apl: Connection.APL) -> List[int]:
     return totals
 
 
-def get_counts(apl: Connection.APL, sentence: str, language: str) -> List[int]:
-    """Return the trigram counts for each trigram of a sentence."""
-    code = "{lang}_counts[{lang}_trigrams ⍳ 3,/⊃∆]".format(lang=language)
-    return apl.eval(code, sentence.lower())
+def counts_code(language: str) -> str:
+    """APL code that looks up the trigram counts of a sentence (given as ∆)."""
+    return "{lang}_counts[{lang}_trigrams ⍳ 3,/⊃∆]".format(lang=language)
 
 
 def recognise_sentence(apl: Connection.APL, totals: List[int], sentence: str) -> str:
     """Performs automatic language recognition on the given sentence."""
 
+    # look up the counts for all languages in one go
+    all_counts = apl.eval_many(
+        [(counts_code(lang), [sentence.lower()]) for lang in LANGUAGES]
+    )
     log_probabilities = [
-        sum(math.log(c/total) for c in get_counts(apl, sentence.lower(), lang))
-        for lang, total in zip(LANGUAGES, totals)
+        sum(math.log(c/total) for c in counts)
+        for counts, total in zip(all_counts, totals)
     ]
     # Find the index where log_probabilities is maximal and return respective language.
     return LANGUAGES[max(range(len(LANGUAGES)), key=log_probabilities.__getitem__)]
@@ -18,18 +18,49 @@ if sys.version_info.major >= 3:
 else:
     import Queue as queue
 
-def APL(debug=False, dyalog=None, forceTCP=False):
+def APL(debug=False, dyalog=None, forceTCP=False, compress=False,
+        unixSocket=False, socketDir=None, socketBuffer=None,
+        cacheWorkspace=False, cacheDir=None, restart=False, warmup=None):
     """Start an APL interpreter
     
     If "dyalog" is set, this is taken to be the path to the Dyalog interpreter.
     If it is not, a suitable Dyalog APL interpreter will be searched for on the
     path (on Unix/Linux) or in the registry (on Windows).
+
+    If "compress" is set, large messages are compressed in both directions.
+
+    If "unixSocket" or "socketDir" is set, the interpreter is talked to over
+    a Unix domain socket, which is made in "socketDir" (by default, the
+    temporary directory). "socketBuffer" sets the size of its buffers in bytes.
+    This is not available on Windows, where TCP is always used.
+
+    If "cacheWorkspace" or "cacheDir" is set, the interpreter is started from
+    a workspace that has the interface loaded already, which is built the
+    first time and kept in "cacheDir" (by default, ~/.cache/pynapl). This is
+    not available on Windows either. The time it took to start is given in
+    the "startupTime" attribute of the result.
+
+    If the interpreter exits, calls to it raise InterpreterExited. If "restart"
+    is set, a new one is started the next time it is used instead. "warmup"
+    is run in every interpreter that is started: either a function, which is
+    given the APL instance, or an APL script to fix.
     
     """
-    return APLPyConnect.Connection.APLClient(DEBUG=debug, dyalog=dyalog, forceTCP=forceTCP)
+    return APLPyConnect.Connection.APLClient(DEBUG=debug, dyalog=dyalog, forceTCP=forceTCP,
+                                             compress=compress, unixSocket=unixSocket,
+                                             socketDir=socketDir, socketBuffer=socketBuffer,
+                                             cacheWorkspace=cacheWorkspace, cacheDir=cacheDir,
+                                             restart=restart, warmup=warmup)
 
 APLArray = Array.APLArray
 APLError = APLPyConnect.APLError
+InterpreterExited = APLPyConnect.InterpreterExited
+
+from .APLPool import APLPool
+
+if sys.version_info >= (3, 5):
+    # the asyncio interface needs async/await
+    from .AsyncAPL import open_async
 
 def client(inp, outp, threaded=True):
     """Allow an APL interpreter to connect to the running Python instance.
@@ -49,6 +80,11 @@ def client(inp, outp, threaded=True):
             sock = IPC.TCPIO()
             sock.connect('localhost', int(outp))
             conn=APLPyConnect.Connection(sock,sock)
+        elif inp.lower() == 'unix':
+            # then 'outp' should be the path to a Unix domain socket
+            sock = IPC.UnixSocket()
+            sock.connect(outp)
+            conn=APLPyConnect.Connection(sock,sock)
         else:
             # open two pipoes
             i_f = IPC.FIFO(inp)
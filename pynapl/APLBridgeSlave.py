@@ -39,6 +39,13 @@ def runSlave(inp,outp):
         sock.connect('localhost', int(outp))
         
         conn = C.Connection(sock,sock) 
+
+    elif inp=='UNIX':
+        # then 'outp' is the path to a Unix domain socket
+        sock = IPC.UnixSocket()
+        sock.connect(outp)
+
+        conn = C.Connection(sock,sock)
         
     else:
         inp = IPC.FIFO(inp)
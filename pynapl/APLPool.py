@@ -0,0 +1,174 @@
+# APLPool
+# -*- coding: utf-8 -*-
+
+# A pool of APL interpreters. An interpreter does one thing at a time, so to
+# use more than one core, calls are spread out over several of them.
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import os, sys, platform, threading, multiprocessing
+from contextlib import contextmanager
+from .APLPyConnect import Connection, APLError
+
+if sys.version_info.major >= 3:
+    import queue
+else:
+    import Queue as queue
+
+class APLPool(object):
+    """A number of APL interpreters, which calls are spread out over. Each call
+    goes to the interpreter that has the fewest calls going on at the time.
+
+    The interpreters are separate workspaces: fix and tradfn define things in
+    all of them, but a value that is assigned by one eval is only there in the
+    interpreter that ran it."""
+
+    def __init__(self, n=None, debug=False, **kwargs):
+        """Start n interpreters (by default, as many as there are cores). Any
+        other arguments are passed on to APL.APL."""
+        n = n or multiprocessing.cpu_count()
+        self.interpreters = [None] * n
+        self.load = [0] * n  # how many calls each interpreter has going on
+        self.lock = threading.Lock()
+
+        errors = []
+        def start(i):
+            try:
+                self.interpreters[i] = Connection.APLClient(DEBUG=debug, **kwargs)
+            except Exception as e:
+                errors.append(e)
+
+        if os.name=='nt' or 'CYGWIN' in platform.system():
+            # on Windows, the port is passed on through a file, so one at a time
+            for i in range(n): start(i)
+        else:
+            # start them all at once, so as not to wait for each in turn
+            threads = [threading.Thread(target=start, args=(i,)) for i in range(n)]
+            for t in threads: t.start()
+            for t in threads: t.join()
+
+        if errors:
+            self.stop()
+            raise errors[0]
+
+        # interrupts can only be caught on the main thread
+        for apl in self.interpreters:
+            apl.conn.catchInterrupts()
+
+    def __len__(self):
+        return len(self.interpreters)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @contextmanager
+    def using(self, i=None):
+        """Count a call as going on in interpreter i while it runs. If i is not
+        given, the least busy interpreter is used."""
+        with self.lock:
+            # pick and count it in one go, so two threads do not both pick it
+            if i is None:
+                i = min(range(len(self.load)), key=self.load.__getitem__)
+            self.load[i] += 1
+        try:
+            yield self.interpreters[i]
+        finally:
+            with self.lock:
+                self.load[i] -= 1
+
+    @contextmanager
+    def interpreter(self):
+        """Give the least busy interpreter, which is counted as busy for as long
+        as it is in use."""
+        with self.using() as apl:
+            yield apl
+
+    def eval(self, aplexpr, *args, **kwargs):
+        """Evaluate an APL expression in the least busy interpreter. The
+           arguments are as for APL.eval."""
+        with self.interpreter() as apl:
+            return apl.eval(aplexpr, *args, **kwargs)
+
+    def fn(self, aplfn, **kwargs):
+        """Expose an APL function to Python. Each call goes to the least busy
+           interpreter. The arguments are as for APL.fn."""
+        def __fn(*args):
+            with self.interpreter() as apl:
+                return apl.fn(aplfn, **kwargs)(*args)
+        __fn.aplfn = aplfn
+        return __fn
+
+    def broadcast(self, aplexpr, *args, **kwargs):
+        """Evaluate an APL expression in every interpreter, giving a list of
+           the results."""
+        results = []
+        for i in range(len(self.interpreters)):
+            with self.using(i) as apl:
+                results.append(apl.eval(aplexpr, *args, **kwargs))
+        return results
+
+    def fix(self, code):
+        """2⎕FIX an APL script in every interpreter."""
+        if not type(code) is list:
+            code = code.split("\n")
+        return self.broadcast("2⎕FIX ∆", *code)[0]
+
+    def tradfn(self, tradfn):
+        """Define a tradfn or tradop in every interpreter."""
+        name = self.broadcast("⎕FX ,¨∆", *tradfn.split("\n"))[0]
+        if not type(name) is type(""):
+            raise APLError("Error on line %s" % name)
+        return self.fn(name)
+
+    def map(self, aplfn, iterable, chunksize=1):
+        """Apply a monadic APL function to each item, spreading the items out
+           over all the interpreters, and give back a list of the results.
+
+           Items are sent chunksize at a time; for cheap functions, larger
+           chunks cut down on the time spent going back and forth.
+
+           The function is given as APL code, or as a function made by fn."""
+        aplfn = getattr(aplfn, 'aplfn', aplfn)
+        if not isinstance(aplfn, (type(""), bytes)):
+            raise TypeError("map needs an APL function, not %r" % (aplfn,))
+        if isinstance(aplfn, bytes): aplfn = aplfn.decode('utf-8')
+        items = list(iterable)
+        chunks = queue.Queue()
+        for start in range(0, len(items), chunksize):
+            chunks.put(start)
+
+        results = [None] * len(items)
+        errors = []
+        def work(i):
+            with self.using(i) as apl:
+                while not errors:
+                    try: start = chunks.get_nowait()
+                    except queue.Empty: return
+                    chunk = items[start:start+chunksize]
+                    try:
+                        results[start:start+len(chunk)] = list(apl.eval("(%s)¨∆" % aplfn, *chunk))
+                    except Exception as e:
+                        errors.append(e)
+
+        # one thread per interpreter, each taking the next chunk when it is done
+        n = min(len(self.interpreters), chunks.qsize())
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(n)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+
+        if errors: raise errors[0]
+        return results
+
+    def stop(self):
+        """Stop all the interpreters."""
+        # the last to be started put in the last interrupt handler, so it goes first
+        for apl in reversed(self.interpreters):
+            if apl: apl.stop()
+        self.interpreters = []
+        self.load = []
@@ -6,15 +6,31 @@
 # The format of a message is:
 #   0     1  2  3  4         ......
 #   TYPE  SIZE (big-endian)  MESSAGE (`size` bytes, expected to be UTF-8 encoded)
+#
+# Messages that carry arrays may instead hold a binary envelope (see Codec).
+#
+# A message body that is larger than FRAME_SIZE is split up into frames. All
+# frames but the last have type CONT, the last one has the type of the message.
+# The receiver joins the bodies of the frames back together.
+#
+# If compression is turned on for a connection, a frame of at least
+# COMPRESS_MIN bytes is compressed with zlib, and COMPRESSED is added to its
+# type. Every frame is compressed separately. Only types below 0x40 can be
+# compressed. Once one side receives a compressed frame, it starts
+# compressing what it sends as well. APL says in its PID message whether it
+# can decompress frames (see Message.pid_info), and Python only compresses
+# what it sends to APL if it can.
 
 from __future__ import absolute_import 
 from __future__ import division
 from __future__ import unicode_literals
 from __future__ import print_function
 
-import socket, os, time, types, signal, select, sys, json
-import tempfile, platform
-from . import RunDyalog, Interrupt, WinDyalog, IPC
+import socket, os, time, types, signal, select, sys, json, struct, zlib
+import tempfile, platform, threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from . import RunDyalog, Interrupt, WinDyalog, IPC, Codec
 from .Array import *
 from .PyEvaluator import PyEvaluator
 from .ObjectWrapper import *
@@ -23,31 +39,19 @@ from .ObjectWrapper import *
 if sys.version_info.major == 2:
     bytes, str = str, unicode
 
+# on Python 2, futures need the 'futures' package
+try:
+    from concurrent.futures import Future
+except ImportError:
+    Future = None
+
 # in Python 3, allow use of long
 if sys.version_info.major >= 3:
     long = int
 
-# in Python 2, sockets give bytes as ASCII characters.
-# in Python 3, sockets give either Unicode or bytes as ints.
-def maybe_ord(item):
-    if type(item) in (int,long):
-        return item
-    else: 
-        return ord(item)
-
-# these fail when threaded, but that's OK
-def ignoreInterrupts():
-    try: return signal.signal(signal.SIGINT, signal.SIG_IGN)
-    except ValueError: return None # (not on main thread)
-
-def allowInterrupts():
-    try: return signal.signal(signal.SIGINT, signal.default_int_handler)
-    except ValueError: return None # pass (not on main thread)
-
-def setInterrupts(x):
-    if x==None: return None
-    try: return signal.signal(signal.SIGINT, x)
-    except ValueError: return None # pass (not on main thread)
+# the best clock there is for measuring how long things take
+clock = getattr(time, 'perf_counter', time.time)
+
     
 
 class APLError(Exception): 
@@ -72,6 +76,12 @@ class APLError(Exception):
 
 class MalformedMessage(Exception): pass
 
+class InterpreterExited(APLError):
+    """The APL interpreter has gone away."""
+    def __init__(self, returncode=None):
+        APLError.__init__(self, "The APL interpreter has exited (code %s)." % returncode)
+        self.returncode = returncode
+
 class Message(object):
     """A message to be sent to the other side"""
     
@@ -81,109 +91,385 @@ class Message(object):
     REPR=3     # evaluate expr, return repr (for debug)
     EXEC=4     # execute statement(s), return OK or ERR
     REPRRET=5  # return from "REPR"
+    CONT=6     # the message continues in the next frame
     
     EVAL=10    # evaluate a Python expression, including arguments, with APL conversion
     EVALRET=11 # message containing the result of an evaluation
 
+    # The body of these starts with a request ID (4 bytes, big-endian),
+    # so that replies can be matched up with the requests they belong to.
+    TEVAL=12    # evaluate an APL expression, like EVAL
+    TEVALRET=13 # the result of a TEVAL
+    TERR=14     # an error in a TEVAL
+
+    EVALMANY=15 # evaluate a number of APL expressions, with one EVALRET for all
+
+    SET=16     # assign a value to a Python variable, return OK or ERR
+    GET=17     # get the value of a Python variable, return EVALRET or ERR
+
     DBGSerializationRoundTrip = 253 # 
     ERR=255    # Python error
 
+    # the largest body that fits in one frame
     MAX_LEN = 2**32-1
 
-    def __init__(self, mtype, mdata):
-        """Initialize a message"""
-        self.type = mtype
-        self.data = mdata
-        if type(self.data) is str: 
-            self.data = self.data.encode("utf8")
-        if len(self.data) > Message.MAX_LEN:
-            raise ValueError("message body exceeds maximum length")
+    # the length of the header of a frame
+    HEADER_LEN = 5
 
+    # the largest body sent in one frame
+    FRAME_SIZE = 2**20
 
-    def send(self, writer):
-        """Send a message using a writer"""
+    # flag added to the type of a compressed frame
+    COMPRESSED = 0x40
 
-        # turn off interrupt signal handler temporarily
-        s = None
+    # frames smaller than this are not compressed
+    COMPRESS_MIN = 2**12
 
-        # this fails under Python 3 if it happens during shutdown
-        # the workaround is to just ignore it in that case
-        # the error claims SIG_IGN isn't a valid signal
-        try:
-            s = signal.signal(signal.SIGINT, signal.SIG_IGN)
-        except (TypeError, ValueError):
-            pass
+    @staticmethod
+    def pid_info(data):
+        """Read the body of a PID message. This is the process ID, followed by
+        what the sender supports, separated by spaces ('zlib' if it can take
+        compressed frames). Gives (PID, list of what is supported)."""
+        if isinstance(data, bytes): data = data.decode('utf-8')
+        fields = data.split()
+        return int(fields[0]), fields[1:]
 
-        try:
-            b4 = (len(self.data) & 0xFF000000) >> 24
-            b3 = (len(self.data) & 0x00FF0000) >> 16
-            b2 = (len(self.data) & 0x0000FF00) >> 8
-            b1 = (len(self.data) & 0x000000FF) >> 0
-            
-            # Python 2 and 3 handle this differently
-            # Annoyingly enough, the newest Python 3 (.6) has added support for this back in,
-            # but we can't expect that version to be present just yet
-            if sys.version_info.major == 2:
-                writer.write(b"%c%c%c%c%c%s" % (self.type,b4,b3,b2,b1,self.data))
-            else:
-                writer.write(bytes([self.type,b4,b3,b2,b1]))
-                writer.write(self.data)
-            
-            writer.flush()
-        finally:
-            if s: signal.signal(signal.SIGINT, s) 
+    def __init__(self, mtype, mdata):
+        """Initialize a message. The data may be given as a string, as bytes, or
+        as a sequence of byte chunks (as made by Codec.iterencode), which is
+        only gone through while the message is being sent. A message that
+        has been received holds a list of the bodies of its frames."""
+        self.type = mtype
+        self._data = mdata
+        self.compressed = False
+        if type(self._data) is str: 
+            self._data = self._data.encode("utf8")
+
+    @property
+    def data(self):
+        """The body of the message, as one bytes object"""
+        if not isinstance(self._data, bytes):
+            chunks = [self._data] if isinstance(self._data, bytearray) else self._data
+            self._data = b''.join(memoryview(chunk).tobytes() for chunk in chunks)
+        return self._data
+
+    @property
+    def chunks(self):
+        """The body of the message, as a list of chunks. Codec.decode can work
+        through these one by one, without joining them together first."""
+        if isinstance(self._data, (bytes, bytearray)):
+            return [self._data]
+        return self._data
+
+    def frames(self):
+        """Split the body into frames, giving (type, frame) pairs. A frame is a
+        bytearray that starts with room for the header, so that the header can
+        be filled in and the whole frame written at once. No more than
+        FRAME_SIZE bytes of the body are held in a buffer at once."""
+        chunks = self._data
+        if isinstance(chunks, (bytes, bytearray)): chunks = [chunks]
+
+        buf = bytearray(Message.HEADER_LEN)
+        for chunk in chunks:
+            view = memoryview(chunk)
+            while len(buf) - Message.HEADER_LEN + len(view) > Message.FRAME_SIZE:
+                n = Message.FRAME_SIZE - (len(buf) - Message.HEADER_LEN)
+                buf += view[:n]
+                yield Message.CONT, buf
+                buf, view = bytearray(Message.HEADER_LEN), view[n:]
+            buf += view
+
+        yield self.type, buf
+
+    def encoded(self, compress=False):
+        """Give the frames of the message, header and all, ready to be written
+        out. If compress is set, frames that are large enough are compressed."""
+
+        for mtype, frame in self.frames():
+            length = len(frame) - Message.HEADER_LEN
+            if compress and mtype < Message.COMPRESSED \
+            and length >= Message.COMPRESS_MIN:
+                packed = zlib.compress(bytes(frame[Message.HEADER_LEN:]))
+                if len(packed) < length:
+                    mtype, length = mtype | Message.COMPRESSED, len(packed)
+                    frame = bytearray(Message.HEADER_LEN) + packed
+
+            struct.pack_into('>BI', frame, 0, mtype, length)
+            yield frame
+
+    def send(self, writer, compress=False):
+        """Send a message using a writer. Each frame goes out in one write. If
+        compress is set, frames that are large enough are compressed.
+
+        Interrupts are up to the caller (see Connection.send)."""
+
+        for frame in self.encoded(compress):
+            writer.write(frame)
+        
+        writer.flush()
 
     @staticmethod
-    def recv(reader,block=True):
+    def recv(reader,block=True,buffer=None):
         """Read a message from a reader.
         
         If block is set to False, then it will return None if no message is
-        available, rather than wait until one comes in.
+        available, rather than wait until one comes in. Otherwise it simply
+        blocks in the read until the message is there.
+
+        If a RecvBuffer is given, the message is read into that, and is only
+        good until the next message is read into it.
+
+        Interrupts are up to the caller (see Connection.recv).
         """
 
-        s = None
-        setsgn = False
-        
+        if not block and not reader.avail(0): return None
+        if buffer: buffer.reset()
+
+        # read frames until one that is not a continuation comes in
+        frames = []
+        compressed = False
+        while True:
+            mtype, body = Message.recv_frame(reader, buffer)
+            mtype, body, packed = Message.decompress(mtype, body)
+            compressed = compressed or packed
+
+            frames.append(body)
+            if mtype != Message.CONT: break
+
+        msg = Message(mtype, frames)
+        msg.compressed = compressed
+        return msg
+
+    @staticmethod
+    def recv_frame(reader, buffer=None):
+        """Read one frame from a reader, giving (type, body). The body is read
+        into the buffer if one is given and it has room, and into a new
+        bytearray otherwise."""
+        header = buffer.header if buffer else bytearray(Message.HEADER_LEN)
+        Message.readinto(reader, memoryview(header), "header")
+        mtype, length = struct.unpack_from('>BI', header)
+
+        body = buffer.take(length) if buffer else bytearray(length)
+        Message.readinto(reader, memoryview(body), "body")
+        return mtype, body
+
+    @staticmethod
+    def decompress(mtype, body):
+        """Undo the compression of a frame, if it was compressed. Gives
+        (type, body, whether it was compressed)."""
+        if mtype & 0xC0 == Message.COMPRESSED:
+            return mtype & ~Message.COMPRESSED, zlib.decompress(bytes(body)), True
+        return mtype, body, False
+
+    @staticmethod
+    def readinto(reader, view, what):
+        """Fill a memoryview from a reader."""
         try:
-            if block:
-                # wait for message available
-                while True:
-                    if reader.avail(0.1): break
-            else:
-                # if no message available, return None
-                if not reader.avail(0.1): return None
+            while len(view):
+                n = reader.readinto(view)
+                if not n: break
+                view = view[n:]
+        except ValueError:
+            pass # the reader was closed
+
+        if len(view):
+            raise MalformedMessage("out of data while reading message %s" % what)
+
+class PendingResult(Future or object):
+    """The result of an APL expression sent off with APL.submit, which will
+    come in later. Asking for it (or for its exception) handles incoming
+    messages until it is there, or until the timeout runs out."""
+
+    def __init__(self, conn, convert, size):
+        Future.__init__(self)
+        self.conn = conn
+        self.convert = convert # turns the decoded result into what is given back
+        self.size = size       # the size of the request
+
+    def result(self, timeout=None):
+        self.conn.waitFor(self, timeout)
+        return Future.result(self, 0)
+
+    def exception(self, timeout=None):
+        self.conn.waitFor(self, timeout)
+        return Future.exception(self, 0)
+
+class Prepared(object):
+    """An APL expression that has been fixed on the APL side (see
+    APL.prepare). Call it with the arguments to evaluate it."""
+
+    def __init__(self, apl, aplexpr, kwargs):
+        self.apl = apl
+        self.aplexpr = aplexpr
+        self.kwargs = kwargs
+        self.id = None
+        self.generation = None # that of the interpreter it was prepared in
+
+    def __call__(self, *args):
+        return self.apl._call(self, args)
+
+    def __del__(self):
+        # APL is told to expunge it the next time it is sent something
+        try:
+            if self.generation == self.apl.conn.generation:
+                self.apl.unprepared.append(self.id)
+        except AttributeError:
+            pass
 
-                # once we've started reading, finish reading: turn off the interrupt handler
-            try:
-                s, setsgn = signal.signal(signal.SIGINT, signal.SIG_IGN), True
-            except ValueError:
-                pass # we're not on the main thread, so no signaling at all
+class Batch(object):
+    """APL expressions that are to be evaluated in one go (see APL.batch)."""
 
-            # read the header
-            try:
-                inp = reader.read(1)
+    def __init__(self, apl, kwargs):
+        self.apl = apl
+        self.kwargs = kwargs
+        self.exprs = []
+        self.results = None
 
-                mtype = maybe_ord(inp)
+    def eval(self, aplexpr, *args):
+        """Add an expression to the batch. This gives back a BatchResult,
+        which has the result once the batch has been evaluated."""
+        self.exprs.append((aplexpr, args))
+        return BatchResult(self, len(self.exprs) - 1)
 
-                lfield = list(map(maybe_ord, reader.read(4)))
-                length = (lfield[0]<<24) + (lfield[1]<<16) + (lfield[2]<<8) + lfield[3]
-            except (TypeError, IndexError, ValueError):
-                raise MalformedMessage("out of data while reading message header")
+    def __enter__(self):
+        return self
 
-            # read the data
-            try:
-                data = reader.read(length)
-            except ValueError:
-                raise MalformedMessage("out of data while reading message body")
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.results = self.apl.eval_many(self.exprs, **self.kwargs)
+
+class BatchResult(object):
+    """The result of an expression in a batch, once it is there."""
 
-            if len(data) != length:
-                raise MalformedMessage("out of data while reading message body")
+    def __init__(self, batch, index):
+        self.batch = batch
+        self.index = index
 
-            return Message(mtype, data)
+    def result(self):
+        if self.batch.results is None:
+            raise RuntimeError("The batch has not been evaluated yet.")
+        return self.batch.results[self.index]
+
+class RecvBuffer(object):
+    """A buffer that messages are received into, so that receiving a message
+    does not have to allocate anything if it fits. Each message's frames are
+    put one after the other, and are given as memoryviews of it.
+    
+    The buffer is reused for the next message, so a message taken from it is
+    only good until then. The buffer is never resized: a frame that does not
+    fit in it is read into a bytearray of its own."""
+
+    def __init__(self, size=None):
+        self.header = bytearray(Message.HEADER_LEN)
+        self.buf = bytearray(size or Message.FRAME_SIZE)
+        self.used = 0
+
+    def reset(self):
+        self.used = 0
+
+    def take(self, n):
+        """Give a view of the next n bytes of room."""
+        if self.used + n > len(self.buf):
+            return bytearray(n)
+        view = memoryview(self.buf)[self.used : self.used+n]
+        self.used += n
+        return view
+
+class ConnectionLock(object):
+    """A reentrant lock that a thread holds while it is talking to the other
+    side, so that no other thread can send a message in between or take its
+    reply. It keeps track of how often it was taken, how long threads had to
+    wait for it, and how long it was held.
+
+    While Python code that the other side asked for is running, the lock can
+    be let go of (see suspended), so that the code can hand work to other
+    threads that use the connection as well. The other side answers nested
+    requests innermost first, and messages carry nothing to tell them apart,
+    so a thread only gets the lock back once those that let go of it after
+    it have got it back."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.owner = None
+        self.depth = 0
+        self.since = 0
+        self.frames = []    # threads that have let go of it for a while, innermost last
+        self.nested = threading.Condition(threading.Lock())
+        self.acquired = 0   # how many times it was taken
+        self.waited = 0.0   # total time spent waiting for it
+        self.held = 0.0     # total time it was held
+        self.longest = 0.0  # the longest time it was held at once
+
+    def acquire(self):
+        me = threading.current_thread()
+        if self.owner is me:
+            self.depth += 1
+            return
+        start = clock()
+        self.lock.acquire()
+        self.since = clock()
+        self.owner, self.depth = me, 1
+        self.acquired += 1
+        self.waited += self.since - start
+
+    def release(self):
+        self.depth -= 1
+        if self.depth: return
+        held = clock() - self.since
+        self.held += held
+        if held > self.longest: self.longest = held
+        self.owner = None
+        self.lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    @contextmanager
+    def suspended(self):
+        """Let go of the lock for a while, if this thread holds it, and take
+        it back afterwards."""
+        if not self.owner is threading.current_thread():
+            yield
+            return
+        depth, self.depth = self.depth, 1
+        frame = object()
+        with self.nested:
+            self.frames.append(frame)
+        self.release()
+        try:
+            yield
         finally:
-            # turn the interrupt handler back on if we'd turned it off
-            if setsgn:
-                signal.signal(signal.SIGINT, s)
+            self.resume(frame)
+            self.depth = depth
+
+    def resume(self, frame):
+        """Take the lock back after suspended, waiting until no thread that
+        let go of it later is still away."""
+        while True:
+            self.acquire()
+            with self.nested:
+                if self.frames[-1] is frame:
+                    self.frames.pop()
+                    self.nested.notify_all()
+                    return
+                # a reply sent now would go to a more deeply nested request
+                self.release()
+                self.nested.wait()
+
+    def outermost(self):
+        """Whether the thread holding the lock is not in the middle of
+        anything else on the connection."""
+        return self.depth == 1 and not self.frames
+
+    def stats(self):
+        """Give the times (in seconds) and counts kept for the lock."""
+        return {'acquired': self.acquired, 'waited': self.waited,
+                'held': self.held, 'longest': self.longest,
+                'average': self.held / self.acquired if self.acquired else 0.0}
 
         
 
@@ -196,11 +482,15 @@ class Connection(object):
         pid=None
         DEBUG=False
         store=None
+        startupTime=None # seconds from starting Dyalog until it had connected
 
         def __init__(self, conn):
             self.store = ObjectStore()
             self.conn=conn
             self.ops=0 # keeps track of how many operators have been defined
+            self.dropped=[] # kept arrays that APL can let go of
+            self.unprepared=[] # prepared expressions that APL can expunge
+            self.released=[] # APL objects that APL can let go of
 
         def obj(self, obj):
             """Wrap an object so it can be sent to APL."""
@@ -220,24 +510,13 @@ class Connection(object):
                 # already killed it? (destructor might call this function after the user has called it as well)
                 if not self.pid:
                     return
-                try: Message(Message.STOP, "STOP").send(self.conn.outfile)
-                except (ValueError, AttributeError): pass # if already closed, don't care
-                
-                # close the pipes
                 try:
-                    self.conn.infile.close()
-                    self.conn.outfile.close()
-                except:
-                    pass # we're gone anyway
-
-                # give the APL process half a second to exit cleanly
-                time.sleep(.5)
-                
-         
-                if not self.DEBUG:
-                    try: os.kill(self.pid, 15) # SIGTERM
-                    except OSError: pass # just leak the instance, it will be cleaned up once Python exits
+                    with self.conn.lock: self.conn.send(Message.STOP, "STOP")
+                except (ValueError, AttributeError, IOError, OSError, APLError):
+                    pass # if already closed, don't care
                 
+                self.conn.releaseInterrupts()
+                self.conn.shutdown(wait=.5)
                 self.pid=0
 
             else: 
@@ -246,23 +525,27 @@ class Connection(object):
         def __del__(self):
             if self.pid: self.stop()
 
-        def fn(self, aplfn, raw=False):
+        def fn(self, aplfn, raw=False, as_numpy=False, lazy=False, keep=False):
             """Expose an APL function to Python.
 
             The result will be considered niladic if called with no arguments,
             monadic if called with one and dyadic if called with two.
             
             If "raw" is set, the return value will be given as an APLArray rather
-            than be converted to a 'suitable' Python representation.
+            than be converted to a 'suitable' Python representation. If "as_numpy"
+            is set, it will be given as a NumPy array, if "lazy" is set, as
+            a LazyList, and if "keep" is set, as a RemoteArray (see eval).
             """
 
             if not type(aplfn) is str:
                 aplfn = str(aplfn, "utf-8")
 
+            kw = {'raw': raw, 'as_numpy': as_numpy, 'lazy': lazy, 'keep': keep}
+
             def __fn(*args):
-                if len(args)==0: return self.eval(aplfn, raw=raw)
-                if len(args)==1: return self.eval("(%s)⊃∆"%aplfn, args[0], raw=raw)
-                if len(args)==2: return self.eval("(⊃∆)(%s)2⊃∆"%aplfn, args[0], args[1], raw=raw)
+                if len(args)==0: return self.eval(aplfn, **kw)
+                if len(args)==1: return self.eval("(%s)⊃∆"%aplfn, args[0], **kw)
+                if len(args)==2: return self.eval("(⊃∆)(%s)2⊃∆"%aplfn, args[0], args[1], **kw)
                 return APLError("Function must be niladic, monadic or dyadic.")
 
             # op can use this for an optimization
@@ -345,8 +628,10 @@ class Connection(object):
 
             Input must be string, the lines of which will be passed to ⎕FX."""
 
-            Message(Message.EXEC, tradfn).send(self.conn.outfile)
-            reply = self.conn.expect(Message.OK)
+            with self.conn.lock:
+                self.conn.revive()
+                self.conn.send(Message.EXEC, tradfn)
+                reply = self.conn.expect(Message.OK)
 
             if reply.type == Message.ERR:
                 raise APLError(jsobj=str(reply.data,'utf-8'))
@@ -357,13 +642,15 @@ class Connection(object):
             """Run an APL expression, return string representation"""
             
             # send APL message
-            Message(Message.REPR, aplcode).send(self.conn.outfile)
-            reply = self.conn.expect(Message.REPRRET)
+            with self.conn.lock:
+                self.conn.revive()
+                self.conn.send(Message.REPR, aplcode)
+                reply = self.conn.expect(Message.REPRRET)
 
-            if reply.type == Message.ERR:
-                raise APLError(jsobj=str(reply.data,'utf-8'))
-            else:
-                return reply.data
+                if reply.type == Message.ERR:
+                    raise APLError(jsobj=str(reply.data,'utf-8'))
+                else:
+                    return reply.data
 
         def fix(self, code):
             """2⎕FIX an APL script. It will become available in the workspace.
@@ -381,8 +668,144 @@ class Connection(object):
         def eval(self, aplexpr, *args, **kwargs):
             """Evaluate an APL expression. Any extra arguments will be exposed
                as an array ∆. If `raw' is set, the result is not converted to a
-               Python representation."""
+               Python representation. If `as_numpy' is set, the result is given
+               as a NumPy array with the same shape as the APL result. If `lazy'
+               is set, a higher-rank or nested result is given as a LazyList,
+               whose rows are only converted when they are used. If `keep' is
+               set, the result stays in the workspace, and a RemoteArray that
+               refers to it is given instead.
+
+               This can be called from many threads at once: each call has the
+               connection to itself until its result is in."""
            
+            with self.conn.lock:
+                self.conn.revive()
+                return self._roundtrip(self._payload(aplexpr, args, kwargs.get('keep')), kwargs)
+
+        def prepare(self, aplexpr, raw=False, as_numpy=False, lazy=False, keep=False):
+            """Prepare an APL expression that is to be evaluated many times.
+               It is fixed as a dfn on the APL side, so that it is only parsed
+               once; calling the Prepared object that is given back sends
+               just an ID and the arguments, which are exposed as ∆. Being a
+               dfn, names that the expression assigns to are local to it.
+               The dfn is expunged once the Prepared object is no longer used.
+               The keyword arguments are as for eval."""
+            return Prepared(self, aplexpr, {'raw': raw, 'as_numpy': as_numpy, 'lazy': lazy, 'keep': keep})
+
+        def _call(self, prepared, args):
+            """Evaluate a prepared expression, preparing it first if this has
+               not been done yet in the interpreter that is running now."""
+            with self.conn.lock:
+                self.conn.revive()
+                if prepared.generation != self.conn.generation:
+                    prepared.id = self.eval("py.⍙Prepare ⊃∆", self._normalize(prepared.aplexpr))
+                    prepared.generation = self.conn.generation
+                payload = self._payload(prepared.id, args, prepared.kwargs['keep'])
+                return self._roundtrip(payload, prepared.kwargs)
+
+        def _roundtrip(self, payload, kwargs):
+            """Send an EVAL, and give back the converted result."""
+            if self.dropped or self.unprepared or self.released:
+                self._roundtrip(self._payload("py.⍙Drop ∆", self._takeDropped()), {'raw': True})
+
+            self.conn.send(Message.EVAL, Codec.iterencode(payload))
+
+            reply = self.conn.expect(Message.EVALRET)
+
+            if reply.type == Message.ERR:
+                raise APLError(jsobj=reply.data)
+
+            return self._convert(Codec.decode(reply.chunks), kwargs)
+
+        def submit(self, aplexpr, *args, **kwargs):
+            """Send an APL expression off to be evaluated, like eval, but do not
+               wait for the result: a concurrent.futures.Future is given back
+               for it at once. Many expressions can be in flight at the same
+               time; APL evaluates them in the order they were sent.
+
+               Results are picked up whenever Python waits for APL, such as
+               when the result of one of these futures is asked for."""
+
+            with self.conn.lock:
+                self.conn.revive()
+                payload = Codec.encode(self._payload(aplexpr, args))
+                return self.conn.submit(payload, lambda answer: self._convert(answer, kwargs))
+
+        def restart(self):
+            """Start a new interpreter in place of this one. The new one starts
+               out with a fresh workspace, and the warm-up is run in it."""
+            with self.conn.lock:
+                self.conn.restart()
+
+        def lockStats(self):
+            """Give the counts and times (in seconds) kept by the lock that
+               threads using this interpreter take turns on."""
+            return self.conn.lock.stats()
+
+        def eval_many(self, exprs, **kwargs):
+            """Evaluate a number of APL expressions in one go. Each is either a
+               string, or a tuple of an expression and a sequence of arguments
+               (exposed as ∆, as with eval). APL evaluates them in order, and
+               a list of their results is given back; if one fails, the error
+               is raised and the rest are not evaluated. The keyword arguments
+               are as for eval, and apply to each result."""
+            items = [(x, ()) if isinstance(x, (str, bytes)) else x for x in exprs]
+            if not items: return []
+
+            with self.conn.lock:
+                self.conn.revive()
+                payload = APLArray.from_python([self._payload(expr, args, kwargs.get('keep'))
+                                                for expr, args in items], apl=self)
+                self.conn.send(Message.EVALMANY, Codec.iterencode(payload))
+
+                reply = self.conn.expect(Message.EVALRET)
+
+                if reply.type == Message.ERR:
+                    raise APLError(jsobj=reply.data)
+
+                answer = Codec.decode(reply.chunks)
+
+            results = []
+            for i in range(len(items)):
+                result = answer[[i]]
+                if not isinstance(result, Receivable):
+                    # a simple scalar comes as a bare value
+                    result = APLArray.from_python(result, True, self)
+                results.append(self._convert(result, kwargs))
+            return results
+
+        def batch(self, **kwargs):
+            """Gather up expressions to be evaluated together, as with
+               eval_many. Use it in a with block; the expressions are sent
+               off at the end of it.
+
+                  with apl.batch() as b:
+                      x = b.eval("⍳3")
+                  print(x.result())
+            """
+            return Batch(self, kwargs)
+
+        def _payload(self, aplexpr, args, keep=False):
+            """Make the array to send for an expression (or the ID of a prepared
+               one) and its arguments. If keep is set, APL keeps the result."""
+            if not type(aplexpr) is int:
+                aplexpr = self._normalize(aplexpr)
+            body = [aplexpr, args]
+            if keep: body.append(1)
+            return APLArray.from_python(body, apl=self)
+
+        def _takeDropped(self):
+            """Give the IDs of the kept arrays, of the prepared expressions and
+               of the APL objects that are no longer used, taking them off
+               their lists."""
+            taken = []
+            for ids in (self.dropped, self.unprepared, self.released):
+                taken.append(ids[:])
+                del ids[:len(taken[-1])]
+            return taken
+
+        def _normalize(self, aplexpr):
+            """Put an expression on one line."""
             if not type(aplexpr) is str:
                 # this should be an UTF-8 string
                 aplexpr=str(aplexpr, "utf8")
@@ -390,38 +813,68 @@ class Connection(object):
             # normalize (remove superfluous whitespace and newlines, add in ⋄s where
             # necessary)
 
-            aplexpr = '⋄'.join(x.strip() for x in aplexpr.split("\n") if x.strip()) \
-                         .replace('{⋄','{').replace('⋄}','}') \
-                         .replace('(⋄','(').replace('⋄)',')')
+            return '⋄'.join(x.strip() for x in aplexpr.split("\n") if x.strip()) \
+                      .replace('{⋄','{').replace('⋄}','}') \
+                      .replace('(⋄','(').replace('⋄)',')')
 
-            payload = APLArray.from_python([aplexpr, args], apl=self).toJSONString()
-            Message(Message.EVAL, payload).send(self.conn.outfile)
-
-            reply = self.conn.expect(Message.EVALRET)
-
-            if reply.type == Message.ERR:
-                raise APLError(jsobj=reply.data)
-
-            answer = APLArray.fromJSONString(reply.data)
-
-            if 'raw' in kwargs and kwargs['raw']:
+        def _convert(self, answer, kwargs):
+            """Convert a result as asked for in the arguments to eval."""
+            if kwargs.get('keep', False):
+                return answer.to_python(self)
+            elif 'raw' in kwargs and kwargs['raw']:
                 return answer
+            elif 'as_numpy' in kwargs and kwargs['as_numpy']:
+                return answer.to_numpy(self)
             else:
-                return answer.to_python(self)
+                return answer.to_python(self, lazy=kwargs.get('lazy', False))
 
     @staticmethod
-    def APLClient(DEBUG=False, dyalog=None, forceTCP=False):
-        """Start an APL client. This function returns an APL instance."""
+    def APLClient(DEBUG=False, dyalog=None, forceTCP=False, compress=False,
+                  unixSocket=False, socketDir=None, socketBuffer=None,
+                  cacheWorkspace=False, cacheDir=None, restart=False, warmup=None):
+        """Start an APL client. This function returns an APL instance.
+        If compress is set, large messages are compressed. If unixSocket is
+        set, a Unix domain socket is used rather than two FIFOs; it is made in
+        socketDir, with buffers of socketBuffer bytes. If cacheWorkspace is
+        set, APL is started from a prebuilt workspace, which is kept in
+        cacheDir. The time it took to start is kept in startupTime.
+
+        If restart is set, a new interpreter is started in place of one that
+        has exited, the next time it is used. The warm-up (a function that is
+        given the APL instance, or an APL script to fix) is run in every
+        interpreter that is started."""
         
         # if on Windows, use TCP always
         if os.name=='nt' or 'CYGWIN' in platform.system():
             forceTCP=True 
-       
-        if forceTCP:
+
+        if cacheWorkspace or cacheDir:
+            cacheDir = cacheDir or RunDyalog.cache_dir()
+
+        connobj = Connection(None, None, signon=False, compress=compress)
+        connobj.options = {'dyalog': dyalog, 'forceTCP': forceTCP, 'unixSocket': unixSocket,
+                           'socketDir': socketDir, 'socketBuffer': socketBuffer,
+                           'cacheDir': cacheDir, 'compress': compress}
+        connobj.autoRestart = restart
+        connobj.warmup = warmup
+        connobj.apl.DEBUG = DEBUG
+        connobj.launch()
+        return connobj.apl
+
+    def launch(self):
+        """Start an interpreter as set up by APLClient, and connect to it."""
+        DEBUG, opts = self.apl.DEBUG, self.options
+
+        if opts['forceTCP']:
             # use TCP 
             inpipe = outpipe = IPC.TCPIO() # TCP connection is bidirectional
             outarg = 'TCP'
             inarg = str(inpipe.startServer())
+        elif opts['unixSocket'] or opts['socketDir']:
+            # so is a Unix domain socket
+            inpipe = outpipe = IPC.UnixSocket(opts['socketBuffer'])
+            outarg = 'UNIX'
+            inarg = inpipe.startServer(opts['socketDir'])
         else:    
             # make two named pipes
             inpipe = IPC.FIFO()
@@ -434,95 +887,352 @@ class Connection(object):
             print("out: ",outarg)
 
         # start up Dyalog
-        if not DEBUG: RunDyalog.dystart(outarg, inarg, dyalog=dyalog)
-
-        if forceTCP:
-            # wait for Python to make the connection 
-            inpipe.acceptConnection()
-        else: 
-            # start the writer first
-            outpipe.openWrite()
-            inpipe.openRead()
+        started = time.time()
+        self.process = None
+        if not DEBUG:
+            self.process = RunDyalog.dystart(outarg, inarg, dyalog=opts['dyalog'],
+                                             cachedir=opts['cacheDir'])
+
+        # if APL exits before it has connected, it is not waited for forever
+        process = self.process
+        alive = None if process is None else process.running
+        try:
+            if opts['forceTCP'] or opts['unixSocket'] or opts['socketDir']:
+                # wait for APL to make the connection 
+                inpipe.acceptConnection(alive)
+            else: 
+                # start the writer first
+                outpipe.openWrite(alive)
+                inpipe.openRead(alive)
+                # if APL goes away, the pipe is closed for good
+                inpipe.peerExited = self.hasExited
+        except EOFError:
+            self.checkExited()
+            raise
 
         if DEBUG:print("Waiting for PID...")
-        connobj = Connection(inpipe, outpipe, signon=False)
+        self.infile, self.outfile = inpipe, outpipe
+        self.exited = False
+        self.generation += 1
 
         # ask for the PID
-        pidmsg = connobj.expect(Message.PID)
+        pidmsg = self.expect(Message.PID)
         
         if pidmsg.type==Message.ERR:
             raise APLError(pidmsg.data)
         else:
-            pid=int(pidmsg.data)
-            if DEBUG:print("Ok! pid=%d" % pid)
-            apl = connobj.apl
+            pid, supported = Message.pid_info(pidmsg.data)
+            # only compress if APL can decompress
+            self.compress = opts['compress'] and 'zlib' in supported
+            apl = self.apl
             apl.pid = pid
-            apl.DEBUG=DEBUG
+            apl.startupTime = time.time() - started
+            if DEBUG:print("Ok! pid=%d, started in %.3fs" % (pid, apl.startupTime))
             
             # if we are on Windows, hide the window
             if os.name=='nt': WinDyalog.hide(pid)
-            
-            return apl
 
-    def __init__(self, infile, outfile, signon=True):
+            if callable(self.warmup):
+                self.warmup(apl)
+            elif self.warmup:
+                apl.fix(self.warmup)
+
+    # No more than this many submitted requests, taking up no more than this
+    # many bytes in all, are sent off before waiting for replies. This keeps
+    # both sides from getting stuck writing to each other when the pipes fill.
+    PIPELINE_DEPTH = 64
+    PIPELINE_BYTES = 2**15
+
+    def __init__(self, infile, outfile, signon=True, compress=False):
         self.infile=infile
         self.outfile=outfile
+        self.compress=compress
         self.apl = Connection.APL(self)
         self.isSlave = False
+        self.buffer = RecvBuffer()
+        self.pending = OrderedDict() # submitted requests, by ID
+        self.inflight = 0            # the size of those requests
+        self.lastid = 0
+        self.lock = ConnectionLock()
+        self.catchInterrupts()
         if signon:
-            Message(Message.PID, str(os.getpid())).send(self.outfile)
+            self.send(Message.PID, str(os.getpid()))
             self.isSlave = True
 
+    # The interpreter this connection was started with (a DyalogProcess),
+    # if it was started from this side, and whether it is known to have exited
+    process = None
+    exited = False
+
+    # Counts the interpreters that have been launched on this connection, as
+    # what was prepared in one is gone in the next
+    generation = 0
+
+    # How to start a new interpreter (see APLClient), and whether to do so
+    # once this one has exited
+    options = None
+    autoRestart = False
+    warmup = None
+
+    def send(self, mtype, data):
+        """Send a message to the other side. No interrupt is raised while the
+        message is being written."""
+        if self.exited: self.checkExited()
+        interruptible, self.interruptible = self.interruptible, False
+        try:
+            Message(mtype, data).send(self.outfile, self.compress)
+        except (IOError, OSError, ValueError):
+            # a broken pipe, most likely because APL is gone
+            self.checkExited()
+            raise
+        finally:
+            self.interruptible = interruptible
+
+    def recv(self, block=True):
+        """Receive a message from the other side. If it was compressed, turn on
+        compression for this connection as well. No interrupt is raised
+        while the message is being read.
+        
+        The message is read into the connection's buffer, and is only good
+        until the next message is received."""
+        if self.exited: self.checkExited()
+        interruptible, self.interruptible = self.interruptible, False
+        try:
+            msg = Message.recv(self.infile, block, self.buffer)
+        except (MalformedMessage, EOFError, IOError, OSError, ValueError):
+            # out of data, most likely because APL is gone
+            self.checkExited()
+            raise
+        finally:
+            self.interruptible = interruptible
+
+        if not msg is None and msg.compressed:
+            self.compress = True
+        return msg
+
+    def hasExited(self, timeout=.1):
+        """Whether the interpreter has exited. A closed pipe is seen just
+        before the process can be waited for, so this waits a little."""
+        return self.process is not None and self.process.wait(timeout)
+
+    def checkExited(self):
+        """If the interpreter has exited, raise InterpreterExited, and fail
+        any requests that were still waiting for a reply."""
+        if not (self.exited or self.hasExited()): return
+
+        self.exited = True
+        error = InterpreterExited(self.process.returncode)
+        for future in self.pending.values():
+            future.set_exception(error)
+        self.pending.clear()
+        self.inflight = 0
+        raise error
+
+    def shutdown(self, wait=0):
+        """Close the pipes, and wait for the interpreter to exit (no longer than
+        the given time). If it has not, kill it."""
+        for f in (self.infile, self.outfile):
+            try: f.close()
+            except: pass # we're gone anyway
+
+        exited = self.hasExited(wait)
+        if not exited and not self.apl.DEBUG and self.apl.pid:
+            try: os.kill(self.apl.pid, 15) # SIGTERM
+            except OSError: pass # just leak the instance, it will be cleaned up once Python exits
+
+    def restart(self):
+        """Start a new interpreter in place of the current one, stopping that
+        first if it is still running."""
+        self.shutdown()
+        self.apl.pid = None
+        self.pending.clear()
+        self.inflight = 0
+        self.launch()
+
+    def revive(self):
+        """If the interpreter has exited and is to be restarted, do so now.
+        This is only done when the connection is not in the middle of
+        anything, as what was going on then is lost."""
+        gone = self.exited or (self.process is not None and not self.process.running())
+        if gone and self.autoRestart and self.lock.outermost():
+            self.restart()
+
+    # Whether an interrupt may be raised: True if so, False if it is to be
+    # ignored, and None if the connection is not in use at the moment.
+    interruptible = None
+
+    # The SIGINT handler that was there before the connection's own
+    sighandler = None
+
+    def onInterrupt(self, signum, frame):
+        """SIGINT handler. An interrupt is only raised if that is safe to do at
+        the moment, and ignored otherwise. When the connection is not in use,
+        it is left to the handler that was there before."""
+        if self.interruptible is None:
+            if callable(self.sighandler):
+                return self.sighandler(signum, frame)
+            elif self.sighandler == signal.SIG_IGN:
+                return
+            raise KeyboardInterrupt()
+        elif self.interruptible:
+            raise KeyboardInterrupt()
+
+    def catchInterrupts(self):
+        """Install onInterrupt as the SIGINT handler. This is done once, when
+        the connection is made, so that no handlers need to be switched
+        around while messages go back and forth."""
+        try:
+            self.sighandler = signal.signal(signal.SIGINT, self.onInterrupt)
+            # restart blocking reads rather than fail them (for Python 2)
+            if hasattr(signal, 'siginterrupt'): signal.siginterrupt(signal.SIGINT, False)
+        except ValueError: pass # (not on main thread)
+
+    def releaseInterrupts(self):
+        """Put back the SIGINT handler that was there before, unless another
+        one has been installed since."""
+        try:
+            if signal.getsignal(signal.SIGINT) == self.onInterrupt:
+                signal.signal(signal.SIGINT, self.sighandler)
+        except (ValueError, TypeError): pass # (not on main thread, or shutting down)
+
     def runUntilStop(self):
         """Receive messages and respond to them until STOP is received.
+        This blocks until a message comes in; APL is in control, so
+        interrupts are ignored while waiting.
         """
         self.stop = False
         
-        while not self.stop:
-           
-            sig = ignoreInterrupts()
-
-            # is there a message available?
-            msg = Message.recv(self.infile, block=False)
-
-            setInterrupts(sig)
+        interruptible, self.interruptible = self.interruptible, False
+        try:
+            while not self.stop:
+                self.respond(self.recv())
+        finally:
+            self.interruptible = interruptible
 
-            if not msg is None:
-                # yes, respond to it
-                self.respond(msg)
+    def wait(self, timeout=None):
+        """Wait for the next message and receive it, or give None if none
+        comes in before the timeout. If Python is in control, waiting can be
+        interrupted; the interrupt is then passed on to APL."""
+        while True: 
+            try:
+                self.interruptible = not self.isSlave
+                if not self.infile.avail(timeout): return None
+                self.interruptible = False
+                return self.recv()
+            except KeyboardInterrupt:
+                self.interruptible = False
+                self.apl.interrupt()
 
     def expect(self, msgtype):
         """Expect a certain type of message. If such a message or an error
            is received, return it; if a different message is received, then
            handle it and go back to waiting for the right type of message."""
             
-        while True: 
-            s = None
-            try:
-                # only turn off interrupts if the APL side is in control
-                if self.isSlave: s = ignoreInterrupts()
-                msg = Message.recv(self.infile)
-
+        interruptible, self.interruptible = self.interruptible, False
+        try:
+            while True: 
+                msg = self.wait()
                 if msg.type in (msgtype, Message.ERR):
                     return msg
                 else:
-                    if self.isSlave: allowInterrupts()
                     self.respond(msg)
-            except KeyboardInterrupt:
-                self.apl.interrupt()
-            finally:
-                if self.isSlave: setInterrupts(s)
-                pass
+        finally:
+            self.interruptible = interruptible
+
+    def submit(self, payload, convert):
+        """Send an EVAL payload off as a TEVAL, and give back a PendingResult
+        for its reply, to which convert is applied."""
+        if Future is None:
+            raise RuntimeError("submit needs concurrent.futures (the 'futures' package on Python 2)")
+
+        with self.lock:
+            # APL answers in order, so wait for the oldest request if need be
+            while self.pending and (len(self.pending) >= self.PIPELINE_DEPTH
+                                    or self.inflight + len(payload) > self.PIPELINE_BYTES):
+                self.waitFor(next(iter(self.pending.values())))
+
+            self.lastid = self.lastid % 0xFFFFFFFF + 1
+            future = PendingResult(self, convert, len(payload))
+            future.set_running_or_notify_cancel() # it cannot be taken back once sent
+            self.pending[self.lastid] = future
+            self.inflight += future.size
+            self.send(Message.TEVAL, [struct.pack('>I', self.lastid), payload])
+            return future
+
+    def waitFor(self, future, timeout=None):
+        """Handle incoming messages until a submitted request has its reply,
+        or until the timeout (in seconds) runs out. Another thread may pick
+        up the reply in the meantime, so the lock is taken anew for each
+        message."""
+        deadline = None if timeout is None else time.time() + timeout
+        while not future.done():
+            with self.lock:
+                if future.done(): break
+                interruptible, self.interruptible = self.interruptible, False
+                try:
+                    msg = self.wait(None if deadline is None else max(0, deadline - time.time()))
+                    if msg is None:
+                        break # timed out
+                    elif msg.type == Message.ERR:
+                        raise APLError(jsobj=msg.data)
+                    else:
+                        self.respond(msg)
+                finally:
+                    self.interruptible = interruptible
+
+    def resolve(self, message):
+        """Give the result in a TEVALRET or TERR to the request it belongs to."""
+        reader = Codec.ChunkReader(message.chunks)
+        rid, = struct.unpack('>I', reader.read(4))
+        future = self.pending.pop(rid, None)
+        if future is None: return # not one of ours
+        self.inflight -= future.size
+
+        try:
+            if message.type == Message.TERR:
+                raise APLError(jsobj=reader.read(reader.remaining()))
+            future.set_result(future.convert(Codec.decode(reader)))
+        except Exception as e:
+            future.set_exception(e)
+
+    def evaluator(self, message):
+        """Unpack an EVAL message, giving a PyEvaluator for it."""
+        val = Codec.decode(message.chunks)
+        # unpack code
+        if val.rho != [2]: 
+            raise MalformedMessage("EVAL expects a ⍴=2 array, but got: %s" % repr(val.rho))
+
+        if not isinstance(val[[0]], APLArray):
+            raise MalformedMessage("First argument must contain code string.")
+
+        code = val[[0]].to_python(self.apl)
+        if not type(code) in (str,bytes):
+            raise MalformedMessage("Code element must be a string, but got: %s" % repr(code))
+
+        # unpack arguments
+        args = val[[1]]
+        if not isinstance(val[[1]], APLArray) \
+        or len(val[[1]].rho) != 1:
+            raise MalformedMessage("Argument list must be rank-1 array.")
+
+        return PyEvaluator(code, args, self)
 
     def respond(self, message):
+        # replies to submitted requests are not answered, only picked up
+        if message.type in (Message.TEVALRET, Message.TERR):
+            return self.resolve(message)
+
         # Add ctrl+c signal handling
+        interruptible, self.interruptible = self.interruptible, True
         try:
             self.respond_inner(message)
         except KeyboardInterrupt:
             # If there is an interrupt during 'respond', then that means
             # the Python side was interrupted, and we need to tell the
             # APL this.
-            Message(Message.ERR, "Interrupt").send(self.outfile)
+            self.send(Message.ERR, "Interrupt")
+        finally:
+            self.interruptible = interruptible
 
     def respond_inner(self, message):
         """Respond to a message"""
@@ -530,92 +1240,98 @@ class Connection(object):
         t = message.type
         if t==Message.OK:
             # return 'OK' to such messages
-            Message(Message.OK, message.data).send(self.outfile)
+            self.send(Message.OK, message.data)
 
         elif t==Message.PID:
             # this is interpreted as asking for the PID
-            Message(Message.PID, str(os.getpid())).send(self.outfile)
+            self.send(Message.PID, str(os.getpid()))
         
         elif t==Message.STOP:
             # send a 'STOP' back in acknowledgement and set the stop flag
             self.stop = True
-            Message(Message.STOP, "STOP").send(self.outfile)
+            self.send(Message.STOP, "STOP")
         
         elif t==Message.REPR:
             # evaluate the input and send the Python representation back
             try:
                 val = repr(eval(message.data))
-                Message(Message.REPRRET, val).send(self.outfile)
+                self.send(Message.REPRRET, val)
             except Exception as e:
-                Message(Message.ERR, repr(e)).send(self.outfile)
+                self.send(Message.ERR, repr(e))
 
         elif t==Message.EXEC:
             # execute some Python code in the global context
-            sig = None
             try:
-                sig = allowInterrupts()
-
                 script = message.data
                 if type(script) is bytes:
                     script = str(script, 'utf-8')
 
                 PyEvaluator.executeInContext(script, self.apl)
-                Message(Message.OK, '').send(self.outfile)
+                self.send(Message.OK, '')
             except Exception as e:
-                Message(Message.ERR, repr(e)).send(self.outfile)
-            finally:
-                setInterrupts(sig)
+                self.send(Message.ERR, repr(e))
 
         elif t==Message.EVAL:
             # evaluate a Python expression with optional arguments
             # expected input: APLArray, first elem = expr string, 2nd elem = arguments
             # output, if not an APLArray already, will be automagically converted
 
-            sig = None
             try:
-                sig = allowInterrupts()
-                val = APLArray.fromJSONString(message.data)
-                # unpack code
-                if val.rho != [2]: 
-                    raise MalformedMessage("EVAL expects a ⍴=2 array, but got: %s" % repr(val.rho))
-
-                if not isinstance(val[[0]], APLArray):
-                    raise MalformedMessage("First argument must contain code string.")
-
-                code = val[[0]].to_python(self.apl)
-                if not type(code) in (str,bytes):
-                    raise MalformedMessage("Code element must be a string, but got: %s" % repr(code))
-
-                # unpack arguments
-                args = val[[1]]
-                if not isinstance(val[[1]], APLArray) \
-                or len(val[[1]].rho) != 1:
-                    raise MalformedMessage("Argument list must be rank-1 array.")
-
-                result = PyEvaluator(code, args, self).go().toJSONString()
-                Message(Message.EVALRET, result).send(self.outfile)
+                evaluator = self.evaluator(message)
+                # the code may hand work to other threads that use APL too
+                with self.lock.suspended():
+                    retval = evaluator.run()
+                result = Codec.iterencode(evaluator.wrap(retval))
+                self.send(Message.EVALRET, result)
             except Exception as e:
                 #raise
-                Message(Message.ERR, repr(e)).send(self.outfile)
-            finally:
-                setInterrupts(sig)
+                self.send(Message.ERR, repr(e))
 
 
+        elif t==Message.SET:
+            # assign a value to a Python variable
+            # expected input: APLArray of the target, the value, and whether
+            # to convert the value to a Python representation
+            try:
+                val = Codec.decode(message.chunks)
+                target, value, convert = val[[0]].to_python(self.apl), val[[1]], val[[2]]
+                if convert and isinstance(value, Receivable):
+                    value = value.to_python(self.apl)
+                elif not convert and not isinstance(value, Receivable):
+                    # a simple scalar comes as a bare value
+                    value = APLArray.from_python(value, True, self.apl)
+                PyEvaluator.assign(target, value, self.apl)
+                self.send(Message.OK, '')
+            except Exception as e:
+                self.send(Message.ERR, repr(e))
+
+        elif t==Message.GET:
+            # send back the value of a Python variable
+            try:
+                target = message.data
+                if type(target) is bytes:
+                    target = str(target, 'utf-8')
+
+                value = PyEvaluator.lookup(target, self.apl)
+                self.send(Message.EVALRET, Codec.iterencode(APLArray.from_python(value, True, self.apl)))
+            except Exception as e:
+                self.send(Message.ERR, repr(e))
+
         elif t==Message.DBGSerializationRoundTrip:
             # this is a debug message. Deserialize the contents, print them to stdout, reserialize and send back
             try:
                 print("Received data: ", message.data)
                 print("---------------")
 
-                aplarr = APLArray.fromJSONString(message.data)
-                serialized = aplarr.toJSONString()
+                aplarr = Codec.decode(message.data)
+                serialized = Codec.encode(aplarr)
 
                 print("Sending back: ", serialized)
                 print("---------------")
 
-                Message(Message.DBGSerializationRoundTrip, serialized).send(self.outfile)
+                self.send(Message.DBGSerializationRoundTrip, serialized)
             except Exception as e:
-                Message(Message.ERR, repr(e)).send(self.outfile)          
+                self.send(Message.ERR, repr(e))          
         else:
-            Message(Message.ERR, "unknown message type #%d / data:%s"%(message.type,message.data)).send(self.outfile)
+            self.send(Message.ERR, "unknown message type #%d / data:%s"%(message.type,message.data))
 
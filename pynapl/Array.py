@@ -9,10 +9,14 @@ import operator
 import json
 import codecs
 
+from array import array
+
 try:
-    from collections.abc import Iterable  # Correct way in recent Python 3 versions.
+    from collections.abc import Iterable, Sequence  # Correct way in recent Python 3 versions.
 except ImportError:
-    from collections import Iterable
+    from collections import Iterable, Sequence
+
+from collections import OrderedDict
 
 
 try:
@@ -35,6 +39,68 @@ if sys.version_info.major == 2:
     bytes = str
     str = unicode
 
+# Simple arrays keep their elements in a typed array.array rather than in a
+# list of Python objects. These are the typecodes that are used.
+def has_typecode(typecode):
+    """See if array.array supports a typecode (array.typecodes is Python 3 only)"""
+    if sys.version_info.major == 2: typecode = typecode.encode('ascii')
+    try:
+        array(typecode)
+        return True
+    except ValueError:
+        return False
+
+CHAR_TYPECODE = 'w' if has_typecode('w') else 'u'
+FLOAT_TYPECODE = 'd'
+INT_TYPECODES = (('b', 2**7), ('h', 2**15), ('i', 2**31),
+                 ('q' if has_typecode('q') else 'l', 2**63))
+
+INT_TYPES = {int, long, bool}
+
+def mkarray(typecode, initializer=()):
+    """Make an array.array (in Python 2, the typecode must be a byte string)"""
+    if sys.version_info.major == 2: typecode = typecode.encode('ascii')
+    return array(typecode, initializer)
+
+def array_frombytes(typecode, data):
+    """Make an array.array from a buffer of machine values"""
+    arr = mkarray(typecode)
+    if hasattr(arr, 'frombytes'): arr.frombytes(memoryview(data).cast('B'))
+    else: arr.fromstring(memoryview(data).tobytes())
+    return arr
+
+def int_typecode(lo, hi):
+    """Give the smallest integer typecode that holds all values from lo to hi,
+    or None if there is none."""
+    for typecode, limit in INT_TYPECODES:
+        if -limit <= lo and hi < limit: return typecode
+    return None
+
+def compact(data):
+    """Store the elements of an array compactly.
+    
+    If they are all integers, all floats, or all single characters, they are
+    put in an array.array. Anything else (e.g. nested arrays) is kept in a list.
+    """
+    if isinstance(data, array): return data
+    if not type(data) is list: data = list(data)
+    if not data: return data
+
+    types = set(map(type, data))
+    try:
+        if types <= INT_TYPES:
+            typecode = int_typecode(min(data), max(data))
+            if not typecode is None: return mkarray(typecode, data)
+        elif types == {float}:
+            return mkarray(FLOAT_TYPECODE, data)
+        elif types == {str}:
+            chars = ''.join(data)
+            if len(chars) == len(data): return mkarray(CHAR_TYPECODE, chars)
+    except (TypeError, ValueError, OverflowError):
+        pass # it cannot be stored this way after all
+
+    return data
+
 # assuming ⎕IO=0 for now
 class APLNamespace(Sendable, Receivable):
     def __init__(self, dct=None, apl=None):
@@ -97,7 +163,7 @@ class APLObject(Sendable):
     """Can be used to interact with an APL object."""
     
     def __init__(self, apl, id, va, fn):
-        self.__s={'apl':apl, 'id':id, 'va':va, 'fn':fn}
+        self.__s={'apl':apl, 'id':id, 'va':va, 'fn':fn, 'generation':apl.conn.generation}
 
         # create function stubs
         for f in fn:
@@ -131,11 +197,14 @@ class APLObject(Sendable):
             raise AttributeError('No such field: %s' % name)
 
     def __del__(self):
-        # try to tell the APL instance to free this object, if it still exists
-        # it may already be shut down, so don't throw any errors
+        # APL is told to free this object the next time it is sent something
+        # (it is not sent anything from here, as an AsyncAPL can only do that
+        # in a coroutine)
         try:
-            self.__s['apl'].fn('py.⍙Release')(self.__s['id'])
-        except:
+            apl = self.__s['apl']
+            if self.__s['generation'] == apl.conn.generation:
+                apl.released.append(self.__s['id'])
+        except (AttributeError, KeyError):
             pass
 
     def toJSONDict(self):
@@ -146,19 +215,151 @@ class APLObject(Sendable):
             raise RuntimeError("changing the APL interpreter instance out from under an object is not supported")
 
         return self # this already is an usable object
+
+class RemoteArray(Sendable, Receivable):
+    """A handle to an array that is kept in the APL workspace (see the keep
+    argument to eval). It can be passed to APL as an argument without the
+    array itself being sent; use fetch to get the array."""
+
+    # the element types, by ⎕DR
+    DTYPES = {11: 'bool', 83: 'int8', 163: 'int16', 323: 'int32', 645: 'float64',
+              1287: 'decimal', 1289: 'complex128', 80: 'str', 160: 'str',
+              320: 'str', 326: 'object'}
+
+    def __init__(self, id, shape=None, dr=None):
+        self.id = id
+        self.shape = tuple(shape or ())
+        self.dr = dr
+        self.apl = None
+        self.generation = None # that of the interpreter it is kept in
+
+    @property
+    def rank(self):
+        return len(self.shape)
+
+    @property
+    def dtype(self):
+        return RemoteArray.DTYPES.get(self.dr, 'object')
+
+    def __len__(self):
+        if not self.shape: raise TypeError("a scalar has no length")
+        return self.shape[0]
+
+    def fetch(self, **kwargs):
+        """Get the array from APL. The arguments are as for eval."""
+        return self.apl.eval("⊃∆", self, **kwargs)
+
+    def __getitem__(self, key):
+        return self.select(key)
+
+    def select(self, key, **kwargs):
+        """Select part of the array on the APL side, and get only that part.
+        The key gives, for each of the leading axes, an integer, a slice, a
+        list of integers or a list of booleans. The other arguments are as
+        for eval; if keep is set, the part stays in the workspace as well."""
+        if not type(key) is tuple: key = (key,)
+        if len(key) > self.rank:
+            raise IndexError("too many indices for an array of rank %d" % self.rank)
+
+        args = [self]
+        axes = [self.__axis(n, k, args) for n, k in zip(self.shape, key)]
+
+        # axes that are selected whole at the end can be left out
+        while axes and axes[-1] is None: axes.pop()
+        if not axes: return self.fetch(**kwargs)
+
+        index = ','.join('(⊂%s)' % (ax or '⍳%d' % n) for ax, n in zip(axes, self.shape))
+        return self.apl.eval("(%s)⌷⊃∆" % index, *args, **kwargs)
+
+    def head(self, n=5, each=False, **kwargs):
+        """Get the first n major cells of the array. If each is set, get the
+        first n of each of its items instead, such as the first rows of an
+        inverted table (a vector of columns)."""
+        if each: return self.apl.eval("{(%d⌊≢⍵)↑⍵}¨⊃∆" % n, self, **kwargs)
+        return self.select(slice(0, n), **kwargs)
+
+    @staticmethod
+    def __axis(n, key, args):
+        """Give an APL expression for the indices that a key selects along an
+        axis of length n, or None for the whole axis. The expression does not
+        depend on ⎕IO. An index list is added to args, the array of
+        arguments that it is sent in."""
+        if NUMPY_SUPPORT and isinstance(key, (np.ndarray, np.generic)):
+            key = key.tolist()
+
+        if isinstance(key, slice):
+            start, stop, step = key.indices(n)
+            count = len(range(start, stop, step))
+            if (start, step, count) == (0, 1, n): return None
+            if step == 1: return "%s+⍳%d" % (aplint(start), count)
+            return "⎕IO+%s+%s×(⍳%d)-⎕IO" % (aplint(start), aplint(step), count)
+
+        if type(key) in INT_TYPES:
+            i = key + n if key < 0 else key
+            if not 0 <= i < n:
+                raise IndexError("index %d is out of range for an axis of length %d" % (key, n))
+            return "⎕IO+%d" % i
+
+        items = list(key)
+        arg = "((⎕IO+%d)⊃∆)" % len(args)
+        if items and all(type(x) is bool for x in items):
+            if len(items) != n:
+                raise IndexError("a mask of length %d for an axis of length %d" % (len(items), n))
+            args.append(items)
+            return "⍸" + arg
+
+        items = [i + n if i < 0 else i for i in items]
+        if not all(0 <= i < n for i in items):
+            raise IndexError("index out of range for an axis of length %d" % n)
+        args.append(items)
+        return "⎕IO+" + arg
+
+    def __repr__(self):
+        return "<RemoteArray %s, shape %r, %s>" % (self.id, self.shape, self.dtype)
+
+    def __del__(self):
+        # APL is told to let go of it the next time it is sent something
+        try:
+            if self.generation == self.apl.conn.generation:
+                self.apl.dropped.append(self.id)
+        except AttributeError:
+            pass
+
+    def toJSONDict(self):
+        if self.apl is not None and self.generation != self.apl.conn.generation:
+            raise RuntimeError("the interpreter this array was kept in has exited")
+        return {"kept": self.id}
+
+    def to_python(self, apl=None, lazy=False):
+        if self.apl is None and apl is not None:
+            self.apl = apl
+            self.generation = apl.conn.generation
+        elif not apl in [None, self.apl]:
+            raise RuntimeError("an array kept in one interpreter cannot be used in another")
+
+        return self
     
 class APLArray(Sendable, Receivable):
     """Serializable multidimensional array.
       
     Every element of the array must be either a value or another array. 
+
+    The elements are stored in row-major order in `data`. For simple arrays
+    this is a typed array.array, otherwise it is a list.
     """
     
+    __slots__ = ('rho', '_data', 'type_hint', 'apl')
+
     TYPE_HINT_NUM = 0
     TYPE_HINT_CHAR = 1
 
-    data=None
-    rho=None
-    type_hint=None
+    @property
+    def data(self):
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = compact(data)
 
     # json decoder object hook
     def __json_object_hook(jsobj):
@@ -169,7 +370,15 @@ class APLArray(Sendable, Receivable):
                 # this is an APL array
                 type_hint = APLArray.TYPE_HINT_NUM
                 if 't' in jsobj: type_hint = jsobj['t']
-                return APLArray(jsobj['r'], list(jsobj['d']), type_hint=type_hint)
+                data = jsobj['d']
+                if type(data) is str:
+                    # simple character arrays are sent as one string
+                    data = mkarray(CHAR_TYPECODE, data)
+                else:
+                    # a string of other than one character is a character vector
+                    data = [APLArray.from_string(x) if type(x) is str and len(x) != 1 else x
+                            for x in data]
+                return APLArray(jsobj['r'], data, type_hint=type_hint)
             elif 'ns' in jsobj:
                 # this is an APL namespace, which can be represented as a dict in Python
                 return APLNamespace(jsobj['ns'])
@@ -179,6 +388,9 @@ class APLArray(Sendable, Receivable):
             elif 'rid' in jsobj:
                 # this is a reference to a Python object sent over APL
                 return ObjectRef(jsobj['rid'])
+            elif 'kept' in jsobj:
+                # this is a handle to an array kept in the APL workspace
+                return RemoteArray(jsobj['kept'], jsobj.get('shape'), jsobj.get('dr'))
             elif 'imag' in jsobj:
                 # this is a complex number
                 return complex(jsobj['real'], jsobj['imag'])
@@ -191,46 +403,72 @@ class APLArray(Sendable, Receivable):
     _json_decoder = json.JSONDecoder(object_hook=__json_object_hook)
 
 
+    # convert a simple or nested vector, given as its data, to a list or string
+    def __vector_to_python(self, data, apl):
+        # a compactly stored array is simple, and can be converted in one go
+        if isinstance(data, array):
+            if data.typecode == CHAR_TYPECODE \
+            and self.genTypeHint() == APLArray.TYPE_HINT_CHAR:
+                return data.tounicode()
+            return data.tolist()
+
+        # if the type hint says characters, and the array is simple, return a string
+        if self.genTypeHint() == APLArray.TYPE_HINT_CHAR \
+        and not any(isinstance(x, (Sendable, Receivable)) for x in data):
+            return ''.join(data)
+
+        # if not, return a list. If this is a nested array that _does_ have a simple
+        # string in it somewhere, *that* string *will* show up as a string within the
+        # converted object
+        pylist = []
+        for item in data:
+            if isinstance(item,Receivable):
+                item=item.to_python(apl)
+
+            pylist.append(item)
+        return pylist
+
     # convert array to suitable-ish python representation
-    def to_python(self, apl=None):
+    def to_python(self, apl=None, lazy=False):
         """Convert an APLArray to a Python object.
 
         Multidimensional arrays will be split up row-by-row and returned as a nested list, 
-        as if one had done ↓."""
+        as if one had done ↓.
+        
+        If lazy is set, arrays of rank 2 or more, and nested vectors, are instead
+        returned as a LazyList, which converts its major cells only when they are used.
+        This goes for the arrays nested inside it as well."""
 
         if len(self.rho)==0: # scalar
             scalar = self.data[0]
-            if isinstance(scalar, Receivable): return scalar.to_python(apl)
+            if isinstance(scalar, APLArray): return scalar.to_python(apl, lazy)
+            elif isinstance(scalar, Receivable): return scalar.to_python(apl)
             else: return scalar
 
-        elif len(self.rho)==1: # array
-            # if the type hint says characters, and the array is simple, return a string
-            if self.genTypeHint() == APLArray.TYPE_HINT_CHAR \
-            and not any(isinstance(x, (Sendable, Receivable)) for x in self.data):
-                return ''.join(self.data)
+        if lazy and (len(self.rho)>=2 or not isinstance(self.data, array)):
+            return LazyList(self, apl)
 
-            # if not, return a list. If this is a nested array that _does_ have a simple
-            # string in it somewhere, *that* string *will* show up as a string within the
-            # converted object
-            else:
-                pylist = []
-                for item in self.data:
-                    if isinstance(item,Receivable):
-                        item=item.to_python(apl)
-                    
-                    pylist.append(item)
-                return pylist
+        if len(self.rho)==1: # array
+            return self.__vector_to_python(self.data, apl)
 
-        elif len(self.rho)>=2: # higher-rank array
-            # split the array until it is entirely flat
-            arr = self
-            # nocopy is safe here because arr is never modified
-            while len(arr.rho)>0: arr=arr.split(nocopy=True)
-            # convert the flattened array to a python representation
-            return arr.to_python(apl)
+        # higher-rank array: convert the rows along the last axis straight from the data,
+        # then group them along each of the other axes in turn
+        rowlen = self.rho[-1]
+        nrows = product(self.rho[:-1])
+        rows = [self.__vector_to_python(self.data[i*rowlen:(i+1)*rowlen], apl)
+                for i in range(nrows)]
 
-        raise RuntimeError("rho < 0; rho=%d!" % self.rho)
+        for axis in range(len(self.rho)-2, 0, -1):
+            n = self.rho[axis]
+            rows = [rows[i*n:(i+1)*n] for i in range(product(self.rho[:axis]))]
 
+        return rows
+
+    def cell(self, i):
+        """Return the i'th major cell of the array"""
+        size = product(self.rho[1:])
+        return APLArray(self.rho[1:], self.data[i*size:(i+1)*size],
+                        type_hint=self.genTypeHint(), apl=self.apl)
 
     @staticmethod
     def from_python(obj, enclose=True, apl=None):
@@ -246,16 +484,14 @@ class APLArray(Sendable, Receivable):
 
         if NUMPY_SUPPORT:
             # special case this
-            if isinstance(obj, np.matrix)\
-            or isinstance(obj, np.ndarray):
-                shape = obj.shape
-                rank = len(shape)
-                l = obj.tolist()
-                for i in range(rank-1):
-                    l = sum(l, [])
-                
-                l = [APLArray.from_python(x,False,apl) for x in l]
-                return APLArray(rho=shape, data=l, apl=apl)
+            if isinstance(obj, np.ndarray):
+                return APLArray.from_numpy(obj, apl=apl)
+            # NumPy scalars are converted to their Python equivalents
+            if isinstance(obj, np.generic):
+                return APLArray.from_python(obj.item(), enclose, apl)
+
+        if isinstance(obj, LazyList):
+            return obj.array # send back the array it came from
 
         if isinstance(obj, Sendable):
             return obj # it already is of the right type
@@ -285,9 +521,7 @@ class APLArray(Sendable, Receivable):
                 if enclose: return APLArray(rho=[], data=[obj], type_hint=APLArray.TYPE_HINT_CHAR, apl=apl)
                 else: return obj
             else:
-                aplstr = APLArray.from_python(list(obj),False,apl)
-                aplstr.type_hint = APLArray.TYPE_HINT_CHAR
-                return aplstr
+                return APLArray.from_string(obj, apl)
 
         elif type(obj) is bytes:
             # a non-unicode string will be encoded as UTF-8
@@ -318,13 +552,84 @@ class APLArray(Sendable, Receivable):
             # Nope
             raise TypeError("type not supported: " + repr(type(obj)))
 
+    @staticmethod
+    def from_string(string, apl=None):
+        """Create a character vector from a string"""
+        return APLArray([len(string)], mkarray(CHAR_TYPECODE, string),
+                        type_hint=APLArray.TYPE_HINT_CHAR, apl=apl)
+
+    @staticmethod
+    def from_numpy(obj, apl=None):
+        """Create an APLArray from a NumPy array (or matrix).
+        
+        The elements are taken in C order, so the array is never split up
+        into nested lists. Arrays of numbers or of single characters become
+        simple APL arrays, anything else is converted element by element.
+        """
+
+        rho = list(obj.shape)
+        flat = np.ravel(obj, order='C')
+        kind = flat.dtype.kind
+
+        if kind in 'biu':
+            # integers (and booleans, which become integers for APL's sake)
+            # go into the smallest integer buffer that will hold them
+            lo, hi = (int(flat.min()), int(flat.max())) if flat.size else (0, 0)
+            typecode = int_typecode(lo, hi)
+            if not typecode is None:
+                data = array_frombytes(typecode, np.ascontiguousarray(flat, dtype=typecode))
+                return APLArray(rho=rho, data=data, type_hint=APLArray.TYPE_HINT_NUM, apl=apl)
+            return APLArray(rho=rho, data=flat.tolist(), type_hint=APLArray.TYPE_HINT_NUM, apl=apl)
+        elif kind == 'f':
+            data = array_frombytes(FLOAT_TYPECODE, np.ascontiguousarray(flat, dtype=FLOAT_TYPECODE))
+            return APLArray(rho=rho, data=data, type_hint=APLArray.TYPE_HINT_NUM, apl=apl)
+        elif kind == 'c':
+            return APLArray(rho=rho, data=flat.tolist(),
+                            type_hint=APLArray.TYPE_HINT_NUM, apl=apl)
+        elif kind == 'U' and flat.dtype.itemsize == 4:
+            # single characters (empty strings are padding, and become spaces)
+            return APLArray(rho=rho, data=[x or ' ' for x in flat.tolist()],
+                            type_hint=APLArray.TYPE_HINT_CHAR, apl=apl)
+        else:
+            return APLArray(rho=rho, data=[APLArray.from_python(x,False,apl) for x in flat.tolist()],
+                            apl=apl)
+
+    def to_numpy(self, apl=None):
+        """Convert an APLArray to a NumPy array with the same shape.
+
+        Simple arrays become arrays of numbers or of single characters,
+        anything else becomes an array of objects, each of which is
+        converted using to_python. A simple numeric array is not copied: the
+        NumPy array shares its memory with the APLArray.
+        """
+
+        if not NUMPY_SUPPORT:
+            raise RuntimeError("NumPy is not available.")
+
+        if isinstance(self.data, array) and self.data.typecode != CHAR_TYPECODE:
+            arr = np.frombuffer(self.data, dtype=self.data.typecode)
+        elif any(isinstance(x, (Sendable, Receivable)) for x in self.data):
+            arr = np.empty(len(self.data), dtype=object)
+            arr[:] = [x.to_python(apl) if isinstance(x, Receivable) else x
+                      for x in self.data]
+        elif self.genTypeHint() == APLArray.TYPE_HINT_CHAR:
+            arr = np.array(''.join(self.data)).reshape(1).view('U1') if self.data \
+                  else np.empty(0, dtype='U1')
+        else:
+            arr = np.asarray(self.data)
+
+        return arr.reshape(self.rho)
+
     def copy(self):
         """Return an independent deep copy of the array."""
         rho = self.rho
-        data = []
-        for item in self.data:
-            if isinstance(item, APLArray): data.append(item.copy())
-            else: data.append(item)
+        if isinstance(self.data, array):
+            data = self.data[:]
+        else:
+            data = []
+            for item in self.data:
+                if isinstance(item, APLArray): data.append(item.copy())
+                else: data.append(item)
 
         return APLArray(rho, data, self.genTypeHint(), apl=self.apl)
 
@@ -359,12 +664,11 @@ class APLArray(Sendable, Receivable):
             newdata = []
 
             for blockn in range(nblocks):
-                blockdata = []
                 offset = blocksz*blockn
-                for blockitem in range(blocksz):
-                    item = self.data[offset + blockitem]
-                    if isinstance(item, APLArray) and not nocopy: item=item.copy()
-                    blockdata.append(item)
+                blockdata = self.data[offset : offset+blocksz]
+                if not nocopy and not isinstance(blockdata, array):
+                    blockdata = [item.copy() if isinstance(item, APLArray) else item
+                                 for item in blockdata]
 
                 newdata.append(APLArray(apl=self.apl, rho=[blocksz], 
                                           data=blockdata, type_hint=self.genTypeHint()))
@@ -391,13 +695,15 @@ class APLArray(Sendable, Receivable):
     def __init__(self, rho, data, type_hint=None, apl=None):
         self.rho=rho
         self.apl=apl
-        self.data=extend(list(data), product(rho))
-        # deduce type from data
-        if not type_hint is None:
-            # hint is given
-            self.type_hint = type_hint
-        else:
-            self.type_hint = self.genTypeHint()
+        # the data is only copied if it needs to be extended
+        if not isinstance(data, (list, array)): data = list(data)
+        size = product(rho)
+        if len(data) != size: data = extend(data, size)
+        self.data=data
+        # deduce type from data, unless the hint is given
+        self.type_hint = type_hint
+        if type_hint is None:
+            self.genTypeHint()
 
     def flatten_idx(self, idx, IO=0):
         return sum((x-IO)*(y-IO) for x,y in zip(scan_reverse(operator.__mul__,self.rho[1:]+[1]), idx))
@@ -421,12 +727,92 @@ class APLArray(Sendable, Receivable):
     def __setitem__(self,idx,val):
         idx = self.check_valid_idx(idx)
         # make sure that if arrays are added, they are converted transparently
-        self.data[self.flatten_idx(idx)]=APLArray.from_python(val,enclose=False,apl=self.apl)
+        val = APLArray.from_python(val,enclose=False,apl=self.apl)
+        data = self.data
+
+        # if the new value does not fit in a typed buffer, go back to a list
+        if isinstance(data, array) and not type(val) is type(data[0]):
+            data = self._data = list(data)
+        try:
+            data[self.flatten_idx(idx)] = val
+        except (TypeError, OverflowError):
+            data = self._data = list(data)
+            data[self.flatten_idx(idx)] = val
 
     def toJSONDict(self):
-        return {"r": self.rho, "d": self.data, "t": self.genTypeHint()}
+        data = self.data
+        if isinstance(data, array):
+            if data.typecode == CHAR_TYPECODE:
+                # simple character arrays are sent as one string, and a character
+                # vector of other than one element as just the string
+                text = data.tounicode()
+                if len(self.rho) == 1 and len(text) != 1: return text
+                return {"r": self.rho, "d": text, "t": APLArray.TYPE_HINT_CHAR}
+            data = data.tolist()
+        return {"r": self.rho, "d": data, "t": self.genTypeHint()}
 
     @staticmethod 
     def fromJSONString(string):
         if type(string) is bytes: string = str(string, 'utf8')
-        return APLArray._json_decoder.decode(string)
+        obj = APLArray._json_decoder.decode(string)
+        if type(obj) is str: obj = APLArray.from_string(obj)
+        return obj
+
+
+class LazyList(Sequence):
+    """Read-only list of the major cells of an APLArray, which are converted to
+    Python objects only when they are accessed.
+
+    Converted cells are cached; no more than cache_size of them are kept, the
+    least recently used ones being dropped first. Use tolist() to convert
+    the whole array at once."""
+
+    CACHE_SIZE = 256
+
+    def __init__(self, arr, apl=None, cache_size=None):
+        self.array = arr
+        self.apl = apl
+        self.cache_size = cache_size or LazyList.CACHE_SIZE
+        self.__cache = OrderedDict()
+
+    def __len__(self):
+        return self.array.rho[0]
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+
+        if idx < 0: idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("LazyList index out of range")
+
+        cache = self.__cache
+        if idx in cache:
+            # move it to the back, as it is now the most recently used
+            item = cache[idx] = cache.pop(idx)
+            return item
+
+        item = cache[idx] = self.array.cell(idx).to_python(self.apl, lazy=True)
+        if len(cache) > self.cache_size: cache.popitem(last=False)
+        return item
+
+    def __iter__(self):
+        for idx in range(len(self)): yield self[idx]
+
+    def tolist(self):
+        """Convert the whole array to a nested list"""
+        return self.array.to_python(self.apl)
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence) or isinstance(other, (str, bytes)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        return eq if eq is NotImplemented else not eq
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "LazyList(rho=%r)" % (self.array.rho,)
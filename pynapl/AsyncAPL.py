@@ -0,0 +1,314 @@
+# AsyncAPL
+# -*- coding: utf-8 -*-
+
+# asyncio interface to an APL interpreter. This needs Python 3.5 or later.
+#
+# The messages are the same as in APLPyConnect, but they go over asyncio
+# streams. APL expressions are sent as TEVALs, so any number of coroutines
+# can be waiting for APL at the same time; a reader task matches the replies
+# up with the requests. Calls from APL into Python are run as tasks, and if
+# the Python expression gives something awaitable, it is awaited before the
+# result is sent back to APL.
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import asyncio, inspect, os, platform, struct, time
+from . import RunDyalog, WinDyalog, IPC, Codec
+from .APLPyConnect import Message, Connection, APLError, InterpreterExited
+
+
+async def recv_message(reader):
+    """Read a message from an asyncio StreamReader."""
+    frames = []
+    compressed = False
+    while True:
+        header = await reader.readexactly(Message.HEADER_LEN)
+        mtype, length = struct.unpack('>BI', header)
+        mtype, body, packed = Message.decompress(mtype, await reader.readexactly(length))
+        compressed = compressed or packed
+
+        frames.append(body)
+        if mtype != Message.CONT: break
+
+    msg = Message(mtype, frames)
+    msg.compressed = compressed
+    return msg
+
+
+class AsyncAPL(Connection.APL):
+    """Represents an APL interpreter that is used from asyncio.
+
+    eval is a coroutine, and so are eval_many, the functions made by fn,
+    prepared expressions and the result of fix. Operators (op), batches,
+    restart and lockStats are not available."""
+
+    async def eval_async(self, aplexpr, *args, **kwargs):
+        """Evaluate an APL expression. The arguments are as for the eval
+           function of a normal connection."""
+        if self.dropped or self.unprepared or self.released:
+            await self.eval_async("py.⍙Drop ∆", *self._takeDropped(), raw=True)
+        payload = Codec.encode(self._payload(aplexpr, args, kwargs.get('keep')))
+        return await self.conn.submit_async(payload, lambda answer: self._convert(answer, kwargs))
+
+    eval = eval_async
+
+    async def _call(self, prepared, args):
+        """Evaluate a prepared expression (see APL.prepare)."""
+        if prepared.generation != self.conn.generation:
+            prepared.id = await self.eval_async("py.⍙Prepare ⊃∆", self._normalize(prepared.aplexpr))
+            prepared.generation = self.conn.generation
+        payload = Codec.encode(self._payload(prepared.id, args, prepared.kwargs['keep']))
+        return await self.conn.submit_async(payload, lambda answer: self._convert(answer, prepared.kwargs))
+
+    def submit(self, aplexpr, *args, **kwargs):
+        """Start evaluating an APL expression, giving back an asyncio task."""
+        return asyncio.ensure_future(self.eval_async(aplexpr, *args, **kwargs))
+
+    async def repr(self, aplcode):
+        """Run an APL expression, return string representation"""
+        return await self.eval_async("⍕⍎⊃∆", aplcode)
+
+    async def tradfn(self, tradfn):
+        """Define a tradfn or tradop on the APL side."""
+        name = await self.eval_async("⎕FX ,¨∆", *tradfn.split("\n"))
+        if not type(name) is str:
+            raise APLError("Error on line %s" % name)
+        return self.fn(name)
+
+    async def eval_many(self, exprs, **kwargs):
+        """Evaluate a number of APL expressions, given as for the eval_many
+           function of a normal connection. They are all sent off at once and
+           APL evaluates them in order, but one that fails does not keep the
+           others from being evaluated."""
+        items = [(x, ()) if isinstance(x, (str, bytes)) else x for x in exprs]
+        return list(await asyncio.gather(*[self.eval_async(expr, *args, **kwargs)
+                                           for expr, args in items]))
+
+    def op(self, aplop):
+        raise NotImplementedError("Operators are not available on an asynchronous connection.")
+
+    def batch(self, **kwargs):
+        raise NotImplementedError("Batches are not available on an asynchronous connection; use eval_many.")
+
+    def restart(self):
+        raise NotImplementedError("An asynchronous connection cannot be restarted; open a new one.")
+
+    def lockStats(self):
+        raise NotImplementedError("An asynchronous connection has no lock; nothing waits for it.")
+
+    async def close(self):
+        """Stop the interpreter, waiting for it to shut down cleanly."""
+        if not self.pid:
+            return
+        await self.conn.close()
+        # give it half a second to exit
+        if self.conn.process:
+            await asyncio.get_event_loop().run_in_executor(None, self.conn.process.wait, .5)
+        self.stop()
+
+    def stop(self):
+        """Kill the interpreter right away, unless it has exited already. (Use
+        close to shut it down cleanly.)"""
+        exited = self.conn.process is not None and not self.conn.process.running()
+        if self.pid and not self.DEBUG and not exited:
+            try: os.kill(self.pid, 15) # SIGTERM
+            except OSError: pass
+        self.pid = 0
+
+
+class AsyncConnection(Connection):
+    """A connection over a pair of asyncio streams. Nothing on it blocks:
+    Python does not wait for replies from APL, it awaits them."""
+
+    def __init__(self, reader, writer, compress=False):
+        self.reader = reader
+        self.writer = writer
+        self.infile = self.outfile = None
+        self.compress = compress
+        self.apl = AsyncAPL(self)
+        self.isSlave = False
+        self.stop = False
+        self.pending = {} # futures for the replies to TEVALs, by ID
+        self.lastid = 0
+        self.reading = None
+
+    def send(self, mtype, data):
+        """Send a message to the other side. It is only written to the stream's
+        buffer; drain the writer to wait for it to go out."""
+        for frame in Message(mtype, data).encoded(self.compress):
+            self.writer.write(frame)
+
+    def expect(self, msgtype):
+        raise RuntimeError("This connection is asynchronous; use eval_async.")
+
+    def start(self):
+        """Start the task that reads and handles incoming messages."""
+        self.reading = asyncio.ensure_future(self.run())
+
+    async def submit_async(self, payload, convert):
+        """Send an EVAL payload as a TEVAL, and wait for the reply."""
+        if self.reading is None or self.reading.done():
+            raise APLError("The connection is closed.")
+
+        self.lastid = self.lastid % 0xFFFFFFFF + 1
+        future = asyncio.get_event_loop().create_future()
+        self.pending[self.lastid] = future
+        self.send(Message.TEVAL, [struct.pack('>I', self.lastid), payload])
+        await self.writer.drain()
+        return convert(await future)
+
+    async def run(self):
+        """Read messages until STOP comes in or the stream is closed."""
+        try:
+            while not self.stop:
+                msg = await recv_message(self.reader)
+                if msg.compressed:
+                    self.compress = True
+
+                if msg.type in (Message.TEVALRET, Message.TERR):
+                    self.resolve(msg)
+                elif msg.type == Message.EVAL:
+                    asyncio.ensure_future(self.evaluate(msg))
+                else:
+                    self.respond(msg)
+                    await self.writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass # the other side has gone
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(APLError("The connection was closed."))
+            self.pending.clear()
+
+    def resolve(self, message):
+        """Give the result in a TEVALRET or TERR to the request it belongs to.
+        The result is converted by the coroutine that sent the request."""
+        reader = Codec.ChunkReader(message.chunks)
+        rid, = struct.unpack('>I', reader.read(4))
+        future = self.pending.pop(rid, None)
+        if future is None or future.cancelled(): return
+
+        try:
+            if message.type == Message.TERR:
+                raise APLError(jsobj=reader.read(reader.remaining()))
+            future.set_result(Codec.decode(reader))
+        except Exception as e:
+            future.set_exception(e)
+
+    async def evaluate(self, message):
+        """Respond to an EVAL from APL."""
+        try:
+            evaluator = self.evaluator(message)
+            retval = evaluator.run()
+            if inspect.isawaitable(retval):
+                retval = await retval
+            self.send(Message.EVALRET, Codec.iterencode(evaluator.wrap(retval)))
+        except Exception as e:
+            self.send(Message.ERR, repr(e))
+        await self.writer.drain()
+
+    async def close(self):
+        """Tell APL to stop, and wait (briefly) for it to go."""
+        try:
+            self.send(Message.STOP, "STOP")
+            await self.writer.drain()
+            await asyncio.wait_for(self.reading, 0.5)
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            self.reading.cancel()
+            self.writer.close()
+
+
+async def open_async(dyalog=None, forceTCP=False, compress=False,
+                     unixSocket=False, socketDir=None, socketBuffer=None,
+                     cacheWorkspace=False, cacheDir=None):
+    """Start an APL interpreter, and give back an AsyncAPL for it once it has
+    connected. The arguments are as for APL.APL; debug, restart and warmup
+    are not available."""
+
+    loop = asyncio.get_event_loop()
+    started = time.time()
+
+    if cacheWorkspace or cacheDir:
+        cacheDir = cacheDir or RunDyalog.cache_dir()
+
+    # building the workspace (the first time) takes a while, so not on the loop
+    def dystart(outarg, inarg):
+        return loop.run_in_executor(None, lambda:
+            RunDyalog.dystart(outarg, inarg, dyalog=dyalog, cachedir=cacheDir))
+
+    # if on Windows, use TCP always
+    if os.name=='nt' or 'CYGWIN' in platform.system():
+        forceTCP=True
+
+    if forceTCP or unixSocket or socketDir:
+        # wait for APL to connect to a socket
+        connected = loop.create_future()
+        def accept(reader, writer):
+            if not connected.done(): connected.set_result((reader, writer))
+
+        if forceTCP:
+            srv = IPC.TCPIO()
+            outarg, inarg = 'TCP', str(srv.startServer())
+            server = await asyncio.start_server(accept, sock=srv.srvsock)
+        else:
+            srv = IPC.UnixSocket(socketBuffer)
+            outarg, inarg = 'UNIX', srv.startServer(socketDir)
+            server = await asyncio.start_unix_server(accept, sock=srv.srvsock)
+
+        process = await dystart(outarg, inarg)
+        try:
+            # if APL exits before it has connected, it is not waited for forever
+            while not connected.done():
+                await asyncio.wait([connected], timeout=.05)
+                if not (connected.done() or process.running()):
+                    raise InterpreterExited(process.returncode)
+            reader, writer = connected.result()
+        finally:
+            server.close()
+            # the socket file is not needed anymore
+            if not forceTCP: os.unlink(srv.path)
+
+        if not forceTCP: srv.setup(writer.get_extra_info('socket'))
+    else:
+        # make two named pipes; opening them blocks until APL has opened them too
+        inpipe, outpipe = IPC.FIFO(), IPC.FIFO()
+        process = await dystart(outpipe.name, inpipe.name)
+        try:
+            await loop.run_in_executor(None, outpipe.openWrite, process.running)
+            await loop.run_in_executor(None, inpipe.openRead, process.running)
+        except EOFError:
+            await loop.run_in_executor(None, process.wait, .1)
+            raise InterpreterExited(process.returncode)
+
+        reader = asyncio.StreamReader()
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), inpipe.fileobj)
+        transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin,
+                                                            outpipe.fileobj)
+        writer = asyncio.StreamWriter(transport, protocol, None, loop)
+
+    conn = AsyncConnection(reader, writer)
+    conn.process = process
+
+    # the first thing APL sends is its PID
+    pidmsg = await recv_message(reader)
+    if pidmsg.type != Message.PID:
+        raise APLError(pidmsg.data)
+
+    # only compress if APL can decompress
+    pid, supported = Message.pid_info(pidmsg.data)
+    conn.compress = compress and 'zlib' in supported
+
+    conn.start()
+    apl = conn.apl
+    apl.pid = pid
+    apl.startupTime = time.time() - started
+
+    # if we are on Windows, hide the window
+    if os.name=='nt': WinDyalog.hide(apl.pid)
+
+    return apl
@@ -0,0 +1,436 @@
+# Codec
+# -*- coding: utf-8 -*-
+
+# This module turns arrays into message bodies and back.
+#
+# Message bodies holding arrays are normally JSON. If a body contains simple
+# (non-nested, homogeneous) arrays that are large enough, it is sent as a
+# binary envelope instead, so that the elements of those arrays do not have to
+# go through the JSON encoder one by one:
+#
+#   0     1 ... 8                 9 ...          ...
+#   0x00  JSON LENGTH (LE)        JSON (UTF-8)   BLOBS
+#
+# A JSON body never starts with a zero byte, so the two can be told apart.
+#
+# If the blobs together are larger than SHM_MIN, they are not sent through the
+# connection at all. They are written to a file in SHM_DIR (both sides run on
+# the same machine), and only the name of the file is sent:
+#
+#   0     1 ... 8                 9 ...          ...
+#   0x01  JSON LENGTH (LE)        JSON (UTF-8)   FILE NAME (UTF-8)
+#
+# The receiver reads the blobs from the file, and then removes it.
+# In the JSON part, every packed array is replaced by {"blob": offset}, where
+# offset is the position of its blob within the blob area. A blob is:
+#
+#   0     1     2 ...                        ...
+#   TAG   RANK  DIMENSIONS (8 bytes LE each) ELEMENTS (packed, little-endian)
+#
+# Boolean arrays are packed eight elements to a byte, the first element being
+# the high bit. If one value dominates, the positions of the elements that
+# have the other value are sent instead:
+#
+#   0     1 ... 8          9 ...
+#   FILL  COUNT (LE)       POSITIONS (4 bytes LE each, or 8 if there are 2*32 elements or more)
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import sys
+import json
+import mmap
+import codecs
+import struct
+import binascii
+import tempfile
+
+from array import array
+
+from .Array import APLArray, mkarray, array_frombytes, int_typecode, \
+                   CHAR_TYPECODE, FLOAT_TYPECODE, INT_TYPES
+from .Util import product
+from .ConversionInterface import ArrayEncoder
+
+if sys.version_info.major >= 3:
+    long = int
+
+if sys.version_info.major == 2:
+    bytes, str, chr = str, unicode, unichr
+
+# key used in the JSON part to refer to a blob (not a name starting with ⍙,
+# which ⎕JSON would demangle on export)
+BLOB_KEY = "blob"
+
+# arrays with fewer elements than this are sent as JSON
+PACK_MIN = 64
+
+# blobs are passed in a file in this directory (None to never do this)...
+SHM_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+# ...if they take up at least this many bytes
+SHM_MIN = 2**24
+
+# element types
+BOOL, INT8, INT16, INT32, FLOAT64, COMPLEX128, CHAR8, CHAR16, CHAR32 = range(1, 10)
+
+# booleans, packed into bits or sent as the positions of the less common value
+BITS, BITS_SPARSE = 10, 11
+
+# array typecodes for the numeric types
+TYPECODES = {BOOL: 'b', INT8: 'b', INT16: 'h', INT32: 'i',
+             FLOAT64: FLOAT_TYPECODE, COMPLEX128: FLOAT_TYPECODE}
+
+# the element type that goes with an integer typecode
+INT_TAGS = {'b': INT8, 'h': INT16, 'i': INT32}
+
+# width of one element, in bytes
+WIDTHS = {BOOL: 1, INT8: 1, INT16: 2, INT32: 4, FLOAT64: 8, COMPLEX128: 16,
+          CHAR8: 1, CHAR16: 2, CHAR32: 4}
+
+# text encodings for the character types
+ENCODINGS = {CHAR8: 'latin-1', CHAR16: 'utf-16-le', CHAR32: 'utf-32-le'}
+
+BIG_ENDIAN = sys.byteorder == 'big'
+
+# translation tables between bytes holding 0 and 1 and the digits '0' and '1'
+_BIT_DIGITS = bytearray(range(256))
+_BIT_DIGITS[0:2] = b'01'
+_BIT_DIGITS = bytes(_BIT_DIGITS)
+_BIT_VALUES = bytearray(range(256))
+_BIT_VALUES[ord('0')], _BIT_VALUES[ord('1')] = 0, 1
+_BIT_VALUES = bytes(_BIT_VALUES)
+
+def _tobytes(arr):
+    if BIG_ENDIAN:
+        arr = arr[:] # don't swap the original
+        arr.byteswap()
+    if hasattr(arr, 'tobytes'): return arr.tobytes()
+    else: return arr.tostring()
+
+def _frombytes(typecode, data):
+    arr = array_frombytes(typecode, data)
+    if BIG_ENDIAN: arr.byteswap()
+    return arr
+
+def _bool_bytes(data):
+    """The elements of a boolean array, one byte each"""
+    if not (isinstance(data, array) and data.typecode == 'b'):
+        data = mkarray('b', data)
+    return _tobytes(data)
+
+def _pack_bits(bits):
+    """Pack bytes holding 0 and 1 into bits"""
+    nbytes = (len(bits) + 7) // 8
+    if nbytes == 0: return b''
+    digits = (bits + b'\x00' * (8*nbytes - len(bits))).translate(_BIT_DIGITS)
+    return binascii.unhexlify('%0*x' % (2*nbytes, int(digits, 2)))
+
+def _unpack_bits(packed, n):
+    """Unpack n bits into an array holding 0 and 1"""
+    if n == 0: return mkarray('b')
+    digits = format(int(binascii.hexlify(packed), 16), '0%db' % (8*len(packed)))
+    return array_frombytes('b', digits[:n].encode('ascii').translate(_BIT_VALUES))
+
+def _index_width(n):
+    return 4 if n < 2**32 else 8
+
+def _sparse_count(bits):
+    """The number of elements that do not have the most common value"""
+    ones = bits.count(b'\x01')
+    return min(ones, len(bits) - ones)
+
+def _bits_type(data):
+    bits = _bool_bytes(data)
+    n = len(bits)
+    if 9 + _sparse_count(bits)*_index_width(n) < (n + 7) // 8:
+        return BITS_SPARSE
+    return BITS
+
+def _char_type(hi):
+    if hi < 2**8: return CHAR8
+    if hi < 2**16: return CHAR16
+    return CHAR32
+
+def element_type(arr):
+    """Find the element type of a simple array, or None if it cannot be packed."""
+    data = arr.data
+    if len(data) == 0: return None
+
+    if isinstance(data, array):
+        # compactly stored, so it is known to be simple
+        if data.typecode == CHAR_TYPECODE:
+            return _char_type(ord(max(data)))
+        if data.typecode == FLOAT_TYPECODE:
+            return FLOAT64
+        if data.typecode == 'b' \
+        and not _tobytes(data).translate(None, b'\x00\x01'):
+            return _bits_type(data)
+        if data.typecode in INT_TAGS:
+            return INT_TAGS[data.typecode]
+        types = INT_TYPES
+    else:
+        types = set(map(type, data))
+
+    if types <= INT_TYPES:
+        lo, hi = min(data), max(data)
+        if 0 <= lo and hi <= 1: return _bits_type(data)
+        if not int_typecode(lo, hi) in INT_TAGS:
+            # this only fits in a double, if it fits at all
+            if -2**53 <= lo and hi <= 2**53: return FLOAT64
+            return None
+        return INT_TAGS[int_typecode(lo, hi)]
+
+    if types == {float}: return FLOAT64
+    if types == {complex}: return COMPLEX128
+
+    return None
+
+def blob_size(arr, tag):
+    """The size of the blob an array will be packed into"""
+    n = len(arr.data)
+    if tag == BITS:
+        return 2 + 8*len(arr.rho) + (n + 7) // 8
+    if tag == BITS_SPARSE:
+        return 2 + 8*len(arr.rho) + 9 + _sparse_count(_bool_bytes(arr.data))*_index_width(n)
+    return 2 + 8*len(arr.rho) + n*WIDTHS[tag]
+
+def pack(arr, tag=None):
+    """Pack a simple array into a blob. Returns None if the array should be
+    sent as JSON instead."""
+
+    if tag is None:
+        if len(arr.data) < PACK_MIN: return None
+        tag = element_type(arr)
+        if tag is None: return None
+
+    return b''.join(_blob_parts(arr, tag))
+
+def _blob_parts(arr, tag):
+    yield struct.pack('<BB%dQ' % len(arr.rho), tag, len(arr.rho), *arr.rho)
+    data = arr.data
+
+    if tag in ENCODINGS:
+        yield data.tounicode().encode(ENCODINGS[tag], 'surrogatepass')
+    elif tag == BITS:
+        yield _pack_bits(_bool_bytes(data))
+    elif tag == BITS_SPARSE:
+        bits = _bool_bytes(data)
+        fill = 1 if 2*bits.count(b'\x01') > len(bits) else 0
+        other = b'\x00' if fill else b'\x01'
+        positions = []
+        i = bits.find(other)
+        while i != -1:
+            positions.append(i)
+            i = bits.find(other, i + 1)
+        yield struct.pack('<BQ', fill, len(positions))
+        yield struct.pack('<%d%s' % (len(positions), 'I' if _index_width(len(bits)) == 4 else 'Q'),
+                          *positions)
+    elif tag == COMPLEX128:
+        yield _tobytes(mkarray(FLOAT_TYPECODE, [p for c in data for p in (c.real, c.imag)]))
+    else:
+        typecode = TYPECODES[tag]
+        if not (isinstance(data, array) and data.typecode == typecode):
+            data = mkarray(typecode, data)
+        if BIG_ENDIAN or sys.version_info.major == 2:
+            yield _tobytes(data)
+        else:
+            # the buffer can be used as is, without copying it
+            yield memoryview(data).cast('B')
+
+class ChunkReader(object):
+    """Reads through a message body that is given as a list of chunks (such as
+    the frames it came in). Chunks are taken off the list once they have been
+    read, so that they can be freed while the rest of the body is decoded."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.offset = 0 # position within the first chunk
+        self.pos = 0    # position within the body
+
+    def remaining(self):
+        return sum(map(len, self.chunks)) - self.offset
+
+    def pieces(self, n):
+        """Go through the next n bytes, giving them as memoryviews of the chunks."""
+        while n > 0:
+            if not self.chunks:
+                raise ValueError("out of data while decoding message")
+            chunk = self.chunks[0]
+            piece = memoryview(chunk)[self.offset : self.offset+n]
+            self.offset += len(piece)
+            self.pos += len(piece)
+            n -= len(piece)
+            if self.offset == len(chunk):
+                self.chunks.pop(0)
+                self.offset = 0
+            yield piece
+
+    def read(self, n):
+        return b''.join(piece.tobytes() for piece in self.pieces(n))
+
+    def skip(self, n):
+        for _ in self.pieces(n): pass
+
+def _read_elements(reader, typecode, size):
+    arr = mkarray(typecode)
+    width = arr.itemsize
+    rest = b''
+    for piece in reader.pieces(size):
+        # an element may be split across two chunks
+        if rest: piece = rest + piece.tobytes()
+        cut = len(piece) - len(piece) % width
+        arr.extend(array_frombytes(typecode, piece[:cut]))
+        rest = piece[cut:].tobytes() if isinstance(piece, memoryview) else piece[cut:]
+    if BIG_ENDIAN: arr.byteswap()
+    return arr
+
+def unpack(reader):
+    """Read the next blob and return it as an APLArray."""
+    tag, rank = struct.unpack('<BB', reader.read(2))
+    rho = list(struct.unpack('<%dQ' % rank, reader.read(8*rank)))
+    n = product(rho)
+
+    if tag == BITS:
+        return APLArray(rho, _unpack_bits(reader.read((n + 7) // 8), n),
+                        type_hint=APLArray.TYPE_HINT_NUM)
+    if tag == BITS_SPARSE:
+        fill, count = struct.unpack('<BQ', reader.read(9))
+        width = _index_width(n)
+        positions = struct.unpack('<%d%s' % (count, 'I' if width == 4 else 'Q'),
+                                  reader.read(count*width))
+        bits = bytearray([fill]) * n
+        for i in positions: bits[i] = 1 - fill
+        return APLArray(rho, array_frombytes('b', bits), type_hint=APLArray.TYPE_HINT_NUM)
+
+    size = n*WIDTHS[tag]
+    if tag == CHAR16:
+        # each element is one character, even if two of them would make up
+        # a surrogate pair
+        codes = _read_elements(reader, 'H', size)
+        return APLArray(rho, mkarray(CHAR_TYPECODE, ''.join(map(chr, codes))),
+                        type_hint=APLArray.TYPE_HINT_CHAR)
+    elif tag in ENCODINGS:
+        chars = mkarray(CHAR_TYPECODE, codecs.decode(reader.read(size), ENCODINGS[tag], 'surrogatepass'))
+        return APLArray(rho, chars, type_hint=APLArray.TYPE_HINT_CHAR)
+    elif tag == COMPLEX128:
+        parts = _read_elements(reader, FLOAT_TYPECODE, size)
+        data = [complex(r, i) for r, i in zip(parts[0::2], parts[1::2])]
+    else:
+        data = _read_elements(reader, TYPECODES[tag], size)
+
+    return APLArray(rho, data, type_hint=APLArray.TYPE_HINT_NUM)
+
+class BlobEncoder(ArrayEncoder):
+    """JSON encoder that takes out large simple arrays, to be packed later."""
+
+    def __init__(self, *args, **kwargs):
+        ArrayEncoder.__init__(self, *args, **kwargs)
+        self.packed = []
+        self.size = 0
+
+    def default(self, obj):
+        if isinstance(obj, APLArray) and len(obj.data) >= PACK_MIN:
+            tag = element_type(obj)
+            if not tag is None:
+                ref = {BLOB_KEY: self.size}
+                self.packed.append((obj, tag))
+                self.size += blob_size(obj, tag)
+                return ref
+
+        return ArrayEncoder.default(self, obj)
+
+def iterencode(obj):
+    """Serialize a Sendable into a message body, given as a sequence of chunks.
+
+    The JSON part is encoded straight away, in one go, so any errors show up
+    here, but the blobs are only packed one by one as the chunks are used."""
+    encoder = BlobEncoder(ensure_ascii=False)
+    js = encoder.encode(obj).encode('utf-8')
+
+    if not encoder.packed:
+        return [js]
+
+    if not SHM_DIR is None and encoder.size >= SHM_MIN:
+        path = _write_blobs(encoder.packed)
+        return [b'\x01' + struct.pack('<Q', len(js)), js, path.encode('utf-8')]
+
+    return _envelope(js, encoder.packed)
+
+def _write_blobs(packed):
+    fd, path = tempfile.mkstemp(prefix='pynapl-py-', dir=SHM_DIR)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for arr, tag in packed:
+                for part in _blob_parts(arr, tag): f.write(part)
+    except:
+        os.unlink(path)
+        raise
+    return path
+
+def _envelope(js, packed):
+    yield b'\x00' + struct.pack('<Q', len(js))
+    yield js
+    for arr, tag in packed:
+        for part in _blob_parts(arr, tag): yield part
+
+def encode(obj):
+    """Serialize a Sendable into a message body."""
+    return b''.join(iterencode(obj))
+
+def decode(data):
+    """Deserialize a message body, given as bytes, as a list of chunks, or as a
+    ChunkReader that is at the start of it. The chunks are taken off the list
+    as they are decoded."""
+    if type(data) is str: data = data.encode('utf-8')
+    if isinstance(data, (bytes, bytearray)): data = [data]
+
+    reader = data if isinstance(data, ChunkReader) else ChunkReader(data)
+    kind = reader.read(1)
+    if not kind in (b'\x00', b'\x01'):
+        return APLArray.fromJSONString(kind + reader.read(reader.remaining()))
+
+    jslen, = struct.unpack('<Q', reader.read(8))
+    js = reader.read(jslen)
+
+    if kind == b'\x00':
+        return _decode_envelope(str(js, 'utf-8'), reader)
+
+    # the blobs are in a file, which is removed even if the message is no good
+    path = str(reader.read(reader.remaining()), 'utf-8')
+    try:
+        js = str(js, 'utf-8')
+        with open(path, 'rb') as f:
+            blobs = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if sys.version_info.major == 2: return _decode_envelope(js, ChunkReader([blobs[:]]))
+            with memoryview(blobs) as view: return _decode_envelope(js, ChunkReader([view]))
+        finally:
+            blobs.close()
+    finally:
+        os.unlink(path)
+
+def _decode_envelope(js, reader):
+    object_hook = APLArray._json_decoder.object_hook
+    refs = []
+
+    # the packed arrays are filled in once the JSON part has been decoded
+    def hook(jsobj):
+        if BLOB_KEY in jsobj:
+            arr = APLArray(rho=[0], data=[])
+            refs.append((jsobj[BLOB_KEY], arr))
+            return arr
+        return object_hook(jsobj)
+
+    obj = json.JSONDecoder(object_hook=hook).decode(js)
+
+    # read the blobs in the order they are in
+    start = reader.pos
+    for offset, arr in sorted(refs, key=lambda ref: ref[0]):
+        reader.skip(start + offset - reader.pos)
+        blob = unpack(reader)
+        arr.rho, arr.data, arr.type_hint = blob.rho, blob.data, blob.type_hint
+
+    return obj
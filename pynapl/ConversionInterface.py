@@ -9,6 +9,8 @@ import json
 
 # Any object that can do from_python will inherit from this class
 class Sendable(object):
+    __slots__ = ()
+
     def toJSONDict(self):
         raise NotImplemented()
 
@@ -17,6 +19,8 @@ class Sendable(object):
 
 # Any object that can do to_python will inherit from this class
 class Receivable(object):
+    __slots__ = ()
+
     def to_python(self, apl=None):
         raise NotImplemented()
 
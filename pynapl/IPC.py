@@ -8,7 +8,8 @@ from __future__ import division
 from __future__ import unicode_literals
 from __future__ import print_function
 
-import sys, os, tempfile, select, ctypes, socket, platform
+import sys, os, io, tempfile, select, ctypes, socket, platform, errno, binascii
+import threading
 
 from subprocess import Popen, PIPE
 from ctypes import * 
@@ -33,6 +34,7 @@ def from_bytes(x):
 class FIFO(object):
     def avail(self,timeout): raise NotImplemented()
     def read(self,amount): raise NotImplemented()
+    def readinto(self,buf): raise NotImplemented()
     def write(self,data): raise NotImplemented()
     def openRead(self): raise NotImplemented()
     def openWrite(self): raise NotImplemented()
@@ -72,7 +74,15 @@ class TCPIO(FIFO):
         self.srvsock.listen(1)
         return port 
         
-    def acceptConnection(self): 
+    def waitForClient(self, alive=None):
+        """Wait until there is a connection to accept. If alive is given, it
+        is asked every so often whether the other side is still there; if
+        not, EOFError is raised."""
+        while alive is not None and not select.select([self.srvsock], [], [], .05)[0]:
+            if not alive(): raise EOFError("the other side has gone")
+
+    def acceptConnection(self, alive=None): 
+        self.waitForClient(alive)
         self.sock, _ = self.srvsock.accept()
         self.sockfile = self.sock.makefile('rwb') 
         
@@ -80,7 +90,18 @@ class TCPIO(FIFO):
         return bool(select.select([self.sock], [], [], timeout)[0])
     
     def read(self,amount):
-        return self.sockfile.read(amount) 
+        # read from the socket itself, so that avail() sees all unread data
+        parts = []
+        while amount:
+            inp = self.sock.recv(amount)
+            if not inp: break # closed
+            parts.append(inp)
+            amount -= len(inp)
+        return b''.join(parts)
+
+    def readinto(self,buf):
+        # this may fill only part of the buffer; 0 means the socket was closed
+        return self.sock.recv_into(buf)
         
     def write(self,data):
         return self.sockfile.write(data)
@@ -92,12 +113,67 @@ class TCPIO(FIFO):
         
     def flush(self):
         self.sockfile.flush() 
+
+class UnixSocket(TCPIO):
+    """A Unix domain socket. Like a TCP connection it goes both ways, but it
+    does not go through the network stack. The socket file is made under a
+    random name, so many interpreters can share one directory, and it is
+    removed as soon as the other side has connected."""
+    path=None
+
+    def __init__(self, bufsize=None):
+        # size of the send and receive buffers, None for the system default
+        self.bufsize = bufsize
+
+    def setup(self, sock):
+        if self.bufsize:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.bufsize)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.bufsize)
+        return sock
+
+    def connect(self,path):
+        self.sock = self.setup(socket.socket(socket.AF_UNIX, socket.SOCK_STREAM))
+        self.sock.connect(path)
+        self.sockfile = self.sock.makefile('wb')
+        self.path = path
+
+    def startServer(self, sockdir=None):
+        """Make the socket in sockdir (by default the temporary directory) and
+        return its path."""
+        sockdir = sockdir or tempfile.gettempdir()
+        self.srvsock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        while True:
+            path = os.path.join(sockdir, 'pynapl-%d-%s.sock' %
+                                (os.getpid(), from_bytes(binascii.hexlify(os.urandom(4)))))
+            try:
+                self.srvsock.bind(path)
+                break
+            except socket.error as e:
+                if e.errno != errno.EADDRINUSE: raise
+        self.path = path
+        self.srvsock.listen(1)
+        return path
+
+    def acceptConnection(self, alive=None):
+        self.waitForClient(alive)
+        sock, _ = self.srvsock.accept()
+        self.sock = self.setup(sock)
+        self.sockfile = self.sock.makefile('wb')
+
+        # the socket file is not needed anymore
+        self.srvsock.close()
+        self.srvsock = None
+        os.unlink(self.path)
         
 class UnixFIFO(FIFO):
     fileobj = None
     name = None
     mode = None
 
+    # If set, this is asked at EOF whether the other side has gone for good,
+    # in which case the EOF is passed on instead of the FIFO being reopened.
+    peerExited = None
+
     def __init__(self, name=None):
         if name==None:
             # make one
@@ -110,26 +186,61 @@ class UnixFIFO(FIFO):
         return bool(select.select([self.fileobj], [], [], timeout)[0])
 
     def read(self, amount):
-        inp = self.fileobj.read(amount)
+        # the file is opened unbuffered, so that avail() sees all unread data,
+        # but then a read may give back less than was asked for
+        buf = bytearray(amount)
+        view = memoryview(buf)
+        while len(view):
+            n = self.readinto(view)
+            if n == 0: raise EOFError("the other side has gone")
+            view = view[n:]
+        return bytes(buf)
 
-        # this is necessary in Python 2 for some reason
-        if len(inp)==0:
-            # eof? shouldn't happen, reopen the file
-            self.fileobj = open(self.name, self.mode)
-            inp = self.read(amount)
+    def readinto(self, buf):
+        while True:
+            n = self.fileobj.readinto(buf)
 
-        return inp
+            # this is necessary in Python 2 for some reason
+            if n==0 and len(buf):
+                # eof? shouldn't happen unless the other side is gone
+                if self.peerExited and self.peerExited(): return 0
+                # otherwise, reopen the file
+                self.fileobj = io.open(self.name, self.mode, 0)
+                continue
+
+            return n
 
     def write(self, data):
         self.fileobj.write(data)
 
-    def openRead(self):
+    def openRead(self, alive=None):
         self.mode = 'rb'
-        self.fileobj = open(self.name, self.mode)
+        self.fileobj = self.__open(lambda: io.open(self.name, self.mode, 0), os.O_WRONLY, alive)
 
-    def openWrite(self):
+    def openWrite(self, alive=None):
         self.mode = 'wb'
-        self.fileobj = open(self.name, self.mode)
+        self.fileobj = self.__open(lambda: open(self.name, self.mode), os.O_RDONLY, alive)
+
+    def __open(self, opener, other, alive):
+        """Open the FIFO, which blocks until the other side opens it too. If
+        alive is given, it is asked every so often whether the other side is
+        still there; if it is not, the other end is opened here to let the
+        open go through, and EOFError is raised."""
+        if alive is None: return opener()
+
+        opened = []
+        t = threading.Thread(target=lambda: opened.append(opener()))
+        t.daemon = True
+        t.start()
+        while True:
+            t.join(.05)
+            if not t.is_alive(): break
+            if not alive():
+                os.close(os.open(self.name, other | os.O_NONBLOCK))
+                t.join()
+                for f in opened: f.close()
+                raise EOFError("the other side has gone")
+        return opened[0]
 
     def close(self):
         if not self.fileobj is None:
@@ -7,13 +7,19 @@
 
 from __future__ import absolute_import
 
+import re, threading
+from collections import OrderedDict
 from .Array import *
 
 class PyEvaluator(object):
     """Evaluate a Python expression"""
 
-    # If it's stupid and it works, it's still stupid, but at least it works
-    wrapper=compile(u"retval = eval(code)",u'<APL>',u'exec')
+    # Compiled expressions, with the placeholders that were found in them, by
+    # the text that APL sent. The least recently used are thrown out once
+    # there are more than cacheSize of them.
+    cache=OrderedDict()
+    cacheSize=256
+    cacheLock=threading.Lock()
  
     @staticmethod
     def executeInContext(script, apl):
@@ -22,100 +28,161 @@ class PyEvaluator(object):
         globals()["APL"]=apl
         exec(code,globals())
 
+    @staticmethod
+    def assign(target, value, apl):
+        """Assign a value to a global variable, or to an attribute of one
+        (such as a.b.c). Any other target (such as a[0]) is assigned to by
+        running an assignment statement."""
+        names = target.strip().split(u'.')
+        if all(PyEvaluator.__is_name(n) for n in names):
+            if len(names) == 1:
+                globals()[names[0]] = value
+            else:
+                setattr(PyEvaluator.lookup(u'.'.join(names[:-1]), apl), names[-1], value)
+        else:
+            code = compile(u'%s = __value' % target, u'<APL>', u'exec')
+            exec(code, globals(), {'__value':value, 'APL':apl})
+
+    @staticmethod
+    def lookup(target, apl):
+        """Give the value of a global variable, or of an attribute of one.
+        Any other target is evaluated as an expression."""
+        names = target.strip().split(u'.')
+        if not all(PyEvaluator.__is_name(n) for n in names):
+            return eval(PyEvaluator.compiled(target)[0], globals(), {'APL':apl})
+
+        if names[0] == u'APL': value = apl
+        elif names[0] in globals(): value = globals()[names[0]]
+        else: raise NameError("name '%s' is not defined" % names[0])
+
+        for name in names[1:]:
+            value = getattr(value, name)
+        return value
+
+    @staticmethod
+    def __is_name(name):
+        """Tell whether a string is a Python identifier"""
+        if hasattr(name, 'isidentifier'): return name.isidentifier()
+        return bool(re.match(r'^[A-Za-z_][A-Za-z0-9_]*$', name))
+
     def __init__(self, expr, args, conn):
         self.args=args
-        self.pyargs=[]
-        self.expr=expr
         self.conn=conn
-        self.__expr_arg_subst()
-        self.__check_arg_lens_match()
+        self.expr, placeholders = PyEvaluator.compiled(expr)
+        self.__check_arg_lens_match(placeholders)
 
-    def __expr_arg_subst(self):
-        narg = 0
+        self.pyargs=[]
+        for narg, ch in enumerate(placeholders):
+            curarg = self.args[[narg]]
+            if ch==u'⎕' and (isinstance(curarg,Receivable)):
+                # this argument should be converted to a suitable Python representation
+                self.pyargs.append(curarg.to_python(self.conn.apl))
+            else:
+                self.pyargs.append(curarg)
+
+    @staticmethod
+    def compiled(expr):
+        """Give the code for an expression and its placeholders, from the
+        cache if it has been seen before."""
+        with PyEvaluator.cacheLock:
+            entry = PyEvaluator.cache.pop(expr, None)
+        if entry is None:
+            entry = PyEvaluator.__expr_arg_subst(expr)
+
+        with PyEvaluator.cacheLock:
+            # put it (back) in as the most recently used
+            PyEvaluator.cache[expr] = entry
+            while len(PyEvaluator.cache) > PyEvaluator.cacheSize:
+                PyEvaluator.cache.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def __expr_arg_subst(expr):
+        """Replace the ⎕s and ⍞s (outside of strings) by arguments, and
+        compile the expression. This gives the code and a string of the
+        placeholders in the order they were found."""
+        placeholders = []
         build = []
         inString = False
         sDelim = u""
         escape = False
 
         i=0
-        while i < len(self.expr):
+        while i < len(expr):
            
             # if this character is escaped, skip it
             if escape:
                 escape=False
-                build.append(self.expr[i])
+                build.append(expr[i])
                 i+=1
                 continue
 
             
             # if \ in a string, the next character is excaped
-            if inString and self.expr[i] == u'\\':
+            if inString and expr[i] == u'\\':
                 escape=True
-                build.append(self.expr[i])
+                build.append(expr[i])
                 i+=1
                 continue
 
             # if in a string, check if this is the delimiter
             if inString:
-                if self.expr[i:i+len(sDelim)]==sDelim:
+                if expr[i:i+len(sDelim)]==sDelim:
                     # this is the end of the string
                     inString=False
-                    build.append(self.expr[i:i+len(sDelim)])
+                    build.append(expr[i:i+len(sDelim)])
                     i+=len(sDelim)
                 else:
                     # keep searching
-                    build.append(self.expr[i])
+                    build.append(expr[i])
                     i+=1
                 continue
 
             # if not in a string, check if this is the start of a multiline string
-            if self.expr[i:i+3] in (u"'''", u'"""'):
+            if expr[i:i+3] in (u"'''", u'"""'):
                 # multiline string
-                sDelim = self.expr[i:i+3]
+                sDelim = expr[i:i+3]
                 inString = True
-                build.append(self.expr[i:i+3])
+                build.append(expr[i:i+3])
                 i+=3
                 continue
 
             # single-line string
-            if self.expr[i] in u'\'"':
-                sDelim = self.expr[i]
+            if expr[i] in u'\'"':
+                sDelim = expr[i]
                 inString = True
-                build.append(self.expr[i])
+                build.append(expr[i])
                 i+=1
                 continue
 
             # if it's not any 
-            ch=self.expr[i]
+            ch=expr[i]
             if ch in u'⎕⍞':
-                build.append(u'args[%d]' % narg)
-                curarg = self.args[[narg]]
-                if ch==u'⎕' and (isinstance(curarg,Receivable)):
-                    # this argument should be converted to a suitable Python representation
-                    self.pyargs.append(curarg.to_python(self.conn.apl))
-                else:
-                    self.pyargs.append(curarg)
-                    
-                narg+=1
+                build.append(u'args[%d]' % len(placeholders))
+                placeholders.append(ch)
             else:
                 build.append(ch)
             i+=1
 
-        self.expr=compile(u''.join(build), u'<APL>', u'eval')
+        return compile(u''.join(build), u'<APL>', u'eval'), u''.join(placeholders)
 
-    def __check_arg_lens_match(self):
-        if self.args.rho[0] != len(self.pyargs):
+    def __check_arg_lens_match(self, placeholders):
+        if self.args.rho[0] != len(placeholders):
             raise TypeError("expression argument length mismatch")
 
             
 
-    def go(self):
-        local = {'args':self.pyargs, 'retval':None, 'code':self.expr, 'APL':self.conn.apl}
-        exec(self.wrapper, globals(), local)
-        retval = local['retval']
+    def run(self):
+        """Evaluate the expression, giving back the Python value"""
+        return eval(self.expr, globals(), {'args':self.pyargs, 'APL':self.conn.apl})
 
+    def wrap(self, retval):
+        """Give a value as an APLArray, converting it if need be"""
         if not isinstance(retval, APLArray):
             retval = APLArray.from_python(retval, True, self.conn.apl)
               
-        return retval 
+        return retval
+
+    def go(self):
+        return self.wrap(self.run()) 
 
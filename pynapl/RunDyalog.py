@@ -6,7 +6,7 @@ from __future__ import division
 from __future__ import unicode_literals
 from __future__ import print_function
 
-import sys, os, threading, platform, re
+import sys, os, threading, platform, re, hashlib
 from subprocess import Popen, PIPE
 
 # Use python 3 types in python 2
@@ -25,6 +25,31 @@ script="""
     )OFF
 """
 
+# Build a workspace with the interface already loaded, so that starting up
+# from it does not need to fix the scripts, copy in quadna.dws and conga.dws,
+# or set up the ⎕NAs.
+build_script="""
+    ⎕PW←32767
+    {}2⎕FIX'file://%s'
+    {}2⎕FIX'file://%s'
+    #.IPC.Init
+    {0::⍬ ⋄ 'DRC'#.⎕CY'conga.dws'}⍬
+    ⎕LX←''
+    )SAVE %s
+    )OFF
+"""
+
+# Start from such a workspace
+ws_script="""
+    infile←'%s'
+    outfile←'%s'
+    Py.StartAPLSlave infile outfile
+    )OFF
+"""
+
+# only build one workspace at a time
+build_lock = threading.Lock()
+
 def to_bytes(x):
     if not type(x) is bytes: return x.encode('utf-8')
     else: return x
@@ -38,17 +63,91 @@ def pystr(x):
             return str(x, "utf-8")
     return x 
 
-def posix_dythread(inf,outf, dyalog=b"dyalog"):
+class DyalogProcess(object):
+    """A Dyalog interpreter running in the background. A thread feeds it its
+    input and then waits for it (which is a waitpid), so it is known as soon
+    as it exits, and with what code."""
+
+    def __init__(self, args, input=None, **kwargs):
+        self.popen = None
+        self.returncode = None
+        self.exited = threading.Event()
+
+        t = threading.Thread(target=lambda: self.run(args, input, kwargs))
+        t.daemon = True
+        t.start()
+
+    def run(self, args, input, kwargs):
+        try:
+            self.popen = Popen(args, stdin=PIPE, **kwargs)
+            self.popen.communicate(input=input)
+            self.returncode = self.popen.returncode
+        finally:
+            self.exited.set()
+
+    def running(self):
+        return not self.exited.is_set()
+
+    def wait(self, timeout=None):
+        """Wait for the interpreter to exit, for no longer than the timeout.
+        Gives whether it has exited."""
+        self.exited.wait(timeout)
+        return self.exited.is_set()
+
+def posix_dythread(inf,outf, dyalog=b"dyalog", workspace=None):
     # find the path to IPC.dyalog
     ipcpath=to_bytes(os.path.dirname(SCRIPTFILE))+b'/IPC.dyalog'
 
     # find the path, Py.dyalog should be in the same folder
     path=to_bytes(os.path.dirname(SCRIPTFILE))+b'/Py.dyalog'
     
-    # Run the Dyalog instance in this thread
-    p = Popen([dyalog], stdin=PIPE, preexec_fn=os.setpgrp)
-    s = script % (pystr(ipcpath), pystr(path), inf, outf)
-    p.communicate(input=s.encode("utf8"))
+    # Run the Dyalog instance in the background
+    if workspace:
+        args = [dyalog, to_bytes(workspace)]
+        s = ws_script % (inf, outf)
+    else:
+        args = [dyalog]
+        s = script % (pystr(ipcpath), pystr(path), inf, outf)
+    return DyalogProcess(args, s.encode("utf8"), preexec_fn=os.setpgrp)
+
+def cache_dir():
+    """The directory prebuilt workspaces are kept in by default."""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'pynapl')
+
+def build_workspace(dyalog, cachedir=None):
+    """Give the path to a workspace that has the interface loaded, for the
+    given Dyalog, building it first if it is not there yet.
+
+    The name of the workspace depends on the APL sources, the build script
+    and the Dyalog it is for, so a workspace is built again whenever any of
+    these change."""
+    cachedir = cachedir or cache_dir()
+    srcdir = os.path.dirname(SCRIPTFILE)
+    ipcpath = os.path.join(srcdir, 'IPC.dyalog')
+    pypath = os.path.join(srcdir, 'Py.dyalog')
+
+    key = hashlib.sha1(to_bytes(build_script + ws_script))
+    key.update(to_bytes(dyalog))
+    if os.path.exists(dyalog): key.update(to_bytes(repr(os.path.getmtime(dyalog))))
+    for src in (ipcpath, pypath):
+        with open(src, 'rb') as f: key.update(f.read())
+    path = os.path.join(cachedir, 'pynapl-%s.dws' % key.hexdigest()[:16])
+
+    with build_lock:
+        if os.path.exists(path): return path
+        try: os.makedirs(cachedir)
+        except OSError: pass # (it is there already)
+
+        # build it under a name of its own, so that another process that is
+        # building it as well does not get in the way
+        tmp = path[:-4] + '-%d.dws' % os.getpid()
+        p = Popen([dyalog], stdin=PIPE, stdout=PIPE, preexec_fn=os.setpgrp)
+        p.communicate(input=(build_script % (ipcpath, pypath, tmp)).encode("utf8"))
+        if not os.path.exists(tmp):
+            raise RuntimeError("Could not build workspace %s." % path)
+        os.rename(tmp, path)
+        return path
 
 def cyg_convert_path(path, type):
     return Popen([b"cygpath",type,path],stdout=PIPE).communicate()[0].split(b"\n")[0]
@@ -78,9 +177,8 @@ def win_dythread(dyalog, cygwin=False):
     dyapp = pystr(b'DYAPP=' + path)
     quiet = pystr(b'RIDE_SPAWNED=1') # Do not show session. Start in system tray
     
-    x=Popen([dyalog, dyapp, quiet], startupinfo=startupinfo,
-          preexec_fn=preexec_fn)
-    x.communicate()
+    return DyalogProcess([dyalog, dyapp, quiet], startupinfo=startupinfo,
+                         preexec_fn=preexec_fn)
     
 
 def mac_find_dyalog():
@@ -152,7 +250,10 @@ def windows_find_dyalog():
     except WindowsError:
         raise RuntimeError("Dyalog not found.")
     
-def dystart(inf, outf, dyalog=None):
+def dystart(inf, outf, dyalog=None, cachedir=None):
+    """Start Dyalog, and have it connect to the given pipes. If cachedir is
+    set, it is started from a prebuilt workspace kept there (Unix only).
+    Gives back a DyalogProcess."""
     if os.name=='posix' and not 'CYGWIN' in platform.system():
         if not dyalog: 
             if 'Darwin' in platform.system():
@@ -160,10 +261,10 @@ def dystart(inf, outf, dyalog=None):
                 dyalog=to_bytes(mac_find_dyalog())
             else:
                 dyalog=b"dyalog" # assume it's just on the path, in a normal Unix installation
+
+        workspace = build_workspace(pystr(dyalog), cachedir) if cachedir else None
         
-        t=threading.Thread(target=lambda:posix_dythread(inf,outf,dyalog=dyalog))
-        t.daemon=True
-        t.start()
+        return posix_dythread(inf,outf,dyalog=dyalog,workspace=workspace)
 
     elif os.name=='nt' or 'CYGWIN' in platform.system():
         if inf!='TCP':
@@ -185,12 +286,7 @@ def dystart(inf, outf, dyalog=None):
                 :EndNamespace
             """%int(outf)))
        
-        t=threading.Thread(
-                       target=lambda:win_dythread(dyalog=dyalog,
-                       cygwin='CYGWIN' in platform.system()))
-
-        t.daemon=True
-        t.start()
+        return win_dythread(dyalog=dyalog, cygwin='CYGWIN' in platform.system())
         
     else:
         raise RuntimeError("OS not supported: " + os.name)
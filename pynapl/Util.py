@@ -1,3 +1,4 @@
+# -*- coding: utf-8 -*-
 # Utility functions
 
 from __future__ import absolute_import
@@ -13,6 +14,10 @@ def product(seq):
     """The product of a sequence of numbers"""
     return reduce(operator.__mul__, seq, 1) 
 
+def aplint(n):
+    """Write an integer the way APL does, with a high minus"""
+    return '¯%d' % -n if n < 0 else '%d' % n
+
 def scan_reverse(f, arr):
     """Scan over a list in reverse, using a function"""
     r=list(arr)
@@ -5,10 +5,503 @@ from __future__ import division
 from __future__ import unicode_literals
 
 from .. import APL
+from .. import Codec
+from .. import IPC
+from .. import RunDyalog
+from ..APLPyConnect import Message, Connection, RecvBuffer, InterpreterExited
+from ..Array import APLArray, RemoteArray, APLObject
+from ..PyEvaluator import PyEvaluator
 
 import unittest
 import sys
 import random
+import io
+import os
+import socket
+import tempfile
+import shutil
+import threading
+import time
+import gc
+
+class BufferIO(io.BytesIO):
+    """In-memory stand-in for a FIFO"""
+    def avail(self, timeout): return True
+
+class TestMessage(unittest.TestCase):
+    def test_frames(self):
+        """Large messages should be split into frames and joined back up"""
+        arr = APLArray(rho=[3, 100000], data=[random.random() for _ in range(300000)])
+        buf = BufferIO()
+        Message(Message.EVAL, Codec.iterencode(arr)).send(buf)
+        Message(Message.OK, "done").send(buf)
+        self.assertEqual(Message.CONT, bytearray(buf.getvalue())[0])
+
+        buf.seek(0)
+        msg = Message.recv(buf)
+        self.assertEqual(Message.EVAL, msg.type)
+        self.assertGreater(len(msg.chunks), 1)
+        self.assertEqual(arr, Codec.decode(msg.chunks))
+        self.assertEqual([], msg.chunks) # the frames are let go as they are decoded
+        self.assertEqual(b"done", Message.recv(buf).data)
+
+    def test_compression(self):
+        """Large frames should be compressed if asked, small ones never"""
+        body = "abcd" * 100000
+        buf = BufferIO()
+        Message(Message.EVAL, body).send(buf, compress=True)
+        Message(Message.OK, "done").send(buf, compress=True)
+        self.assertLess(len(buf.getvalue()), len(body) // 10)
+
+        buf.seek(0)
+        msg = Message.recv(buf)
+        self.assertTrue(msg.compressed)
+        self.assertEqual((Message.EVAL, body.encode('utf-8')), (msg.type, bytes(msg.data)))
+        self.assertFalse(Message.recv(buf).compressed)
+
+    def test_pid_info(self):
+        """The PID message should say whether the sender can take compressed frames"""
+        self.assertEqual((1234, ['zlib']), Message.pid_info(b"1234 zlib"))
+        self.assertEqual((1234, []), Message.pid_info("1234"))
+
+    def test_buffer(self):
+        """Frames should be written in one go, and read into the buffer if they fit"""
+        writes = []
+        buf = BufferIO()
+        buf.write = lambda data: writes.append(len(data)) or io.BytesIO.write(buf, data)
+        Message(Message.REPR, "2+2").send(buf)
+        Message(Message.EVAL, b"x" * 100).send(buf)
+        self.assertEqual([8, 105], writes)
+
+        buf.seek(0)
+        recvbuf = RecvBuffer(64)
+        self.assertEqual(b"2+2", Message.recv(buf, buffer=recvbuf).data)
+        self.assertEqual(3, recvbuf.used)
+        self.assertEqual(b"x" * 100, Message.recv(buf, buffer=recvbuf).data)
+        self.assertEqual(0, recvbuf.used) # too large, so it got a bytearray of its own
+
+    @unittest.skipUnless(hasattr(socket, 'AF_UNIX'), "no Unix domain sockets")
+    def test_unix_socket(self):
+        """A Unix domain socket should carry messages both ways, and its file
+        should be gone once connected"""
+        sockdir = tempfile.mkdtemp()
+        try:
+            server, client = IPC.UnixSocket(bufsize=2**16), IPC.UnixSocket()
+            path = server.startServer(sockdir)
+            client.connect(path)
+            server.acceptConnection()
+            self.assertEqual([], os.listdir(sockdir))
+
+            Message(Message.REPR, "6*7").send(client)
+            Message(Message.REPRRET, "42").send(server)
+            self.assertEqual(b"6*7", Message.recv(server).data)
+            self.assertEqual(b"42", Message.recv(client).data)
+            client.close()
+            server.close()
+        finally:
+            os.rmdir(sockdir)
+
+    def test_submit(self):
+        """Submitted expressions should all be sent at once, and replies matched
+        up with their requests"""
+        inbuf, outbuf = BufferIO(), BufferIO()
+        Message(Message.TEVALRET, b"\0\0\0\1" + Codec.encode(APLArray.from_python([1, 2]))).send(inbuf)
+        Message(Message.TERR, b"\0\0\0\2" + b'{"Message": "DOMAIN ERROR"}').send(inbuf)
+        Message(Message.TEVALRET, b"\0\0\0\3" + Codec.encode(APLArray.from_python(3))).send(inbuf)
+        inbuf.seek(0)
+
+        apl = Connection(inbuf, outbuf, signon=False).apl
+        futures = [apl.submit("⍳2"), apl.submit("1÷0"), apl.submit("1+2")]
+        outbuf.seek(0)
+        self.assertEqual([(Message.TEVAL, i) for i in (1, 2, 3)],
+                         [(msg.type, bytearray(msg.data)[3]) for msg in
+                          (Message.recv(outbuf) for _ in futures)])
+
+        self.assertEqual(3, futures[2].result())
+        self.assertEqual([1, 2], futures[0].result())
+        self.assertRaises(APL.APLError, futures[1].result)
+        self.assertEqual({}, apl.conn.pending)
+
+    @unittest.skipIf(sys.version_info < (3, 5), "asyncio interface needs Python 3.5")
+    def test_async(self):
+        """An asynchronous connection should answer APL's calls while its own
+        expressions are waiting, and match the replies up with them"""
+        import asyncio
+        from ..AsyncAPL import AsyncConnection
+
+        a, b = socket.socketpair()
+        fake = IPC.TCPIO()
+        fake.sock, fake.sockfile = b, b.makefile('rwb')
+        got = []
+
+        def fakeAPL():
+            Message(Message.EVAL, Codec.encode(APLArray.from_python(["⎕+1", [41]]))).send(fake)
+            # like APL, answer TEVALs while waiting for the EVALRET
+            for _ in range(3):
+                msg = Message.recv(fake)
+                if msg.type == Message.EVALRET:
+                    got.append(Codec.decode(msg.data).to_python())
+                    continue
+                rid, expr = bytes(msg.data[:4]), Codec.decode(msg.data[4:])
+                if expr[[0]].to_python() == "÷0":
+                    Message(Message.TERR, rid + b'{"Message": "DOMAIN ERROR"}').send(fake)
+                else:
+                    Message(Message.TEVALRET, rid + Codec.encode(APLArray.from_python(6))).send(fake)
+            Message(Message.STOP, "STOP").send(fake)
+            got.append(Message.recv(fake).type)
+            fake.close()
+
+        thread = threading.Thread(target=fakeAPL)
+        thread.start()
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            reader, writer = loop.run_until_complete(asyncio.open_connection(sock=a))
+            conn = AsyncConnection(reader, writer)
+            conn.start()
+            for unavailable in (conn.apl.batch, conn.apl.restart, conn.apl.lockStats):
+                self.assertRaises(NotImplementedError, unavailable)
+            six, err = loop.run_until_complete(asyncio.gather(
+                conn.apl.eval("2×3"), conn.apl.eval("÷0"), return_exceptions=True))
+            loop.run_until_complete(conn.reading)
+            writer.close()
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+            thread.join()
+
+        self.assertEqual(6, six)
+        self.assertIsInstance(err, APL.APLError)
+        self.assertEqual([42, Message.STOP], got)
+        self.assertEqual({}, conn.pending)
+
+    def test_threads(self):
+        """Threads sharing a connection should each get their own results"""
+        a, b = socket.socketpair()
+        ours, fake = IPC.TCPIO(), IPC.TCPIO()
+        ours.sock, ours.sockfile = a, a.makefile('rwb')
+        fake.sock, fake.sockfile = b, b.makefile('rwb')
+
+        def fakeAPL():
+            # answer each expression with its argument
+            while True:
+                msg = Message.recv(fake)
+                if msg.type == Message.STOP: break
+                expr, args = Codec.decode(msg.data).to_python()
+                Message(Message.EVALRET, Codec.encode(APLArray.from_python(args[0]))).send(fake)
+
+        apl = Connection(ours, ours, signon=False).apl
+        results = {}
+        def worker(n):
+            results[n] = [apl.eval("⊃∆", n*100 + i) for i in range(20)]
+
+        threads = [threading.Thread(target=fakeAPL)]
+        threads += [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for t in threads: t.start()
+        for t in threads[1:]: t.join()
+        apl.conn.send(Message.STOP, "STOP")
+        threads[0].join()
+        apl.conn.releaseInterrupts()
+
+        self.assertEqual({n: [n*100 + i for i in range(20)] for n in range(4)}, results)
+        self.assertEqual(80, apl.lockStats()['acquired'])
+
+    def test_nested_threads(self):
+        """A callback that hands work to another thread should not answer APL
+        before the more deeply nested call made from that thread"""
+        a, b = socket.socketpair()
+        ours, fake = IPC.TCPIO(), IPC.TCPIO()
+        ours.sock, ours.sockfile = a, a.makefile('rwb')
+        fake.sock, fake.sockfile = b, b.makefile('rwb')
+        got = []
+
+        def call(expr):
+            # like APL, evaluate incoming expressions while waiting for the result
+            Message(Message.EVAL, Codec.encode(APLArray.from_python([expr, []]))).send(fake)
+            while True:
+                msg = Message.recv(fake)
+                if msg.type != Message.EVAL: return Codec.decode(msg.data).to_python()
+                serve(msg)
+
+        def serve(msg):
+            # each expression is answered by calling back the Python function of that name
+            expr = Codec.decode(msg.data)[[0]].to_python()
+            result = call(expr + "()")
+            got.append((expr, result))
+            Message(Message.EVALRET, Codec.encode(APLArray.from_python(result))).send(fake)
+
+        def fakeAPL():
+            while True:
+                msg = Message.recv(fake)
+                if msg.type == Message.STOP: break
+                serve(msg)
+
+        apl = Connection(ours, ours, signon=False).apl
+        started, results = threading.Event(), {}
+        worker = threading.Thread(target=lambda: results.setdefault('inner', apl.eval("inner")))
+
+        def outer():
+            worker.start()
+            started.wait()
+            return "outer"
+
+        def inner():
+            started.set()
+            time.sleep(.2)
+            return "inner"
+
+        PyEvaluator.assign('outer', outer, apl)
+        PyEvaluator.assign('inner', inner, apl)
+        thread = threading.Thread(target=fakeAPL)
+        thread.start()
+        try:
+            results['outer'] = apl.eval("outer")
+            worker.join()
+        finally:
+            apl.conn.send(Message.STOP, "STOP")
+            thread.join()
+            apl.conn.releaseInterrupts()
+            PyEvaluator.executeInContext("del outer, inner", apl)
+
+        self.assertEqual({'outer': "outer", 'inner': "inner"}, results)
+        self.assertEqual([("inner", "inner"), ("outer", "outer")], got)
+
+    @unittest.skipIf(os.name != 'posix', "needs a Unix shell")
+    def test_interpreter_exit(self):
+        """If the interpreter exits, calls should fail at once, and go on failing"""
+        a, b = socket.socketpair()
+        ours = IPC.TCPIO()
+        ours.sock, ours.sockfile = a, a.makefile('rwb')
+
+        # a stand-in for the interpreter, that exits as soon as it is asked anything
+        conn = Connection(ours, ours, signon=False)
+        conn.process = RunDyalog.DyalogProcess(["sh", "-c", "exit 3"])
+        self.assertTrue(conn.process.wait(5))
+        b.close()
+
+        apl = conn.apl
+        self.assertRaises(InterpreterExited, apl.eval, "⍳3")
+        try:
+            apl.eval("⍳3")
+        except InterpreterExited as e:
+            self.assertEqual(3, e.returncode)
+        self.assertTrue(conn.exited)
+        conn.releaseInterrupts()
+
+    def test_eval_many(self):
+        """A batch should go out as one EVALMANY, and its results come back as a list"""
+        inbuf, outbuf = BufferIO(), BufferIO()
+        Message(Message.EVALRET, Codec.encode(APLArray.from_python([[1, 2, 3], 6, "ab"]))).send(inbuf)
+        Message(Message.EVALRET, Codec.encode(APLArray.from_python([[1, 2, 3], 6, "ab"]))).send(inbuf)
+        inbuf.seek(0)
+
+        apl = Connection(inbuf, outbuf, signon=False).apl
+        with apl.batch() as b:
+            x = b.eval("⍳3")
+            y = b.eval("+/∆", 1, 2, 3)
+            z = b.eval("'ab'")
+            self.assertRaises(RuntimeError, x.result)
+        self.assertEqual(([1, 2, 3], 6, "ab"), (x.result(), y.result(), z.result()))
+        # raw results are APLArrays, scalars too
+        raw = apl.eval_many(["⍳3", "6", "'ab'"], raw=True)
+        self.assertTrue(all(isinstance(r, APLArray) for r in raw))
+        self.assertEqual([[3], [], [2]], [r.rho for r in raw])
+        self.assertEqual([[1, 2, 3], 6, "ab"], [r.to_python() for r in raw])
+
+        outbuf.seek(0)
+        msg = Message.recv(outbuf)
+        self.assertEqual(Message.EVALMANY, msg.type)
+        self.assertEqual([["⍳3", []], ["+/∆", [1, 2, 3]], ["'ab'", []]],
+                         Codec.decode(msg.data).to_python())
+        apl.conn.releaseInterrupts()
+
+    def test_prepare(self):
+        """A prepared expression should be sent once, after that only its ID,
+        and it should be expunged once it is no longer used"""
+        inbuf, outbuf = BufferIO(), BufferIO()
+        for result in [1, 6, 15, [], 3]:
+            Message(Message.EVALRET, Codec.encode(APLArray.from_python(result))).send(inbuf)
+        inbuf.seek(0)
+
+        apl = Connection(inbuf, outbuf, signon=False).apl
+        total = apl.prepare("+/∆")
+        self.assertEqual((6, 15), (total(1, 2, 3), total(4, 5, 6)))
+        del total
+        gc.collect()
+        # functions made by fn are not prepared
+        self.assertEqual(3, apl.fn("+/")([1, 2]))
+
+        outbuf.seek(0)
+        sent = [Codec.decode(Message.recv(outbuf).data).to_python() for _ in range(5)]
+        self.assertEqual(["py.⍙Prepare ⊃∆", ["+/∆"]], sent[0])
+        self.assertEqual([[1, [1, 2, 3]], [1, [4, 5, 6]]], sent[1:3])
+        self.assertEqual(["py.⍙Drop ∆", [[], [1], []]], sent[3])
+        self.assertEqual(["(+/)⊃∆", [[1, 2]]], sent[4])
+        apl.conn.releaseInterrupts()
+
+    def test_keep(self):
+        """A kept result should come back as a handle, which is sent back as is"""
+        inbuf, outbuf = BufferIO(), BufferIO()
+        Message(Message.EVALRET, '{"r":[],"d":[{"kept":3,"shape":[2,2],"dr":323}],"t":0}').send(inbuf)
+        for result in [[], 10, 1]:
+            Message(Message.EVALRET, Codec.encode(APLArray.from_python(result))).send(inbuf)
+        inbuf.seek(0)
+
+        apl = Connection(inbuf, outbuf, signon=False).apl
+        board = apl.eval("2 2⍴⍳4", keep=True)
+        self.assertEqual(((2, 2), 2, 'int32'), (board.shape, board.rank, board.dtype))
+        obj = APLObject(apl, "ref1", [], [])
+        del board, obj
+        gc.collect()
+        # APL is told to drop it before the next expression is sent
+        self.assertEqual(10, apl.eval("+/,⊃∆", RemoteArray(4)))
+        self.assertEqual(1, apl.eval("1"))
+
+        outbuf.seek(0)
+        sent = [Codec.decode(Message.recv(outbuf).data) for _ in range(4)]
+        self.assertEqual(["2 2⍴⍳4", [], 1], sent[0].to_python())
+        self.assertEqual(["py.⍙Drop ∆", [[3], [], ["ref1"]]], sent[1].to_python())
+        self.assertEqual(4, sent[2][[1]][[0]].id)
+        self.assertEqual(["1", []], sent[3].to_python())
+        apl.conn.releaseInterrupts()
+
+    def test_remote_dtype(self):
+        """A kept array should get the dtype that goes with its ⎕DR"""
+        self.assertEqual('complex128', RemoteArray(1, [3], 1289).dtype)
+        self.assertEqual('decimal', RemoteArray(1, [3], 1287).dtype)
+        self.assertEqual('float64', RemoteArray(1, [], 645).dtype)
+
+    def test_remote_select(self):
+        """Indexing a kept array should send one selection, which works whatever ⎕IO is"""
+        inbuf, outbuf = BufferIO(), BufferIO()
+        Message(Message.EVALRET, Codec.encode(APLArray.from_python([7, 11, 15]))).send(inbuf)
+        inbuf.seek(0)
+
+        apl = Connection(inbuf, outbuf, signon=False).apl
+        table = RemoteArray(5, [10, 4], 323).to_python(apl)
+        self.assertEqual([7, 11, 15], table[[1, -8, 3], -1])
+        self.assertRaises(IndexError, table.select, 10)
+        self.assertRaises(IndexError, table.select, (0, 0, 0))
+
+        outbuf.seek(0)
+        sent = Codec.decode(Message.recv(outbuf).data)
+        self.assertEqual("((⊂⎕IO+((⎕IO+1)⊃∆)),(⊂⎕IO+3))⌷⊃∆", sent[[0]].to_python())
+        self.assertEqual(5, sent[[1]][[0]].id)
+        self.assertEqual([1, 2, 3], sent[[1]][[1]].to_python())
+        apl.conn.releaseInterrupts()
+
+    def test_evaluator_cache(self):
+        """An expression that comes in again should not be compiled again"""
+        inbuf, outbuf = BufferIO(), BufferIO()
+        for n in range(3):
+            Message(Message.EVAL, Codec.encode(APLArray.from_python(["⎕*2 + len('⎕')", [n]]))).send(inbuf)
+        Message(Message.STOP, "STOP").send(inbuf)
+        inbuf.seek(0)
+
+        PyEvaluator.cache.clear()
+        Connection(inbuf, outbuf, signon=False).runUntilStop()
+        outbuf.seek(0)
+        results = [Codec.decode(Message.recv(outbuf).data).to_python() for _ in range(3)]
+        self.assertEqual([1, 3, 5], results)
+        self.assertEqual(["⎕*2 + len('⎕')"], list(PyEvaluator.cache))
+
+        # the least recently used are thrown out
+        size, PyEvaluator.cacheSize = PyEvaluator.cacheSize, 2
+        try:
+            for expr in ["1", "2", "1", "3"]: PyEvaluator.compiled(expr)
+            self.assertEqual(["1", "3"], list(PyEvaluator.cache))
+        finally:
+            PyEvaluator.cacheSize = size
+
+    def test_set_get(self):
+        """A variable should be set, and got back, in one message each"""
+        inbuf, outbuf = BufferIO(), BufferIO()
+        for body in [["pynapl_test", [1, 2, 3], 1], ["pynapl_test_raw", "abc", 0]]:
+            Message(Message.SET, Codec.encode(APLArray.from_python(body))).send(inbuf)
+        Message(Message.EXEC, "import types; pynapl_test_ns = types.SimpleNamespace()"
+                if sys.version_info.major >= 3 else "class pynapl_test_ns: pass").send(inbuf)
+        Message(Message.SET, Codec.encode(APLArray.from_python(["pynapl_test_ns.x", 42, 1]))).send(inbuf)
+        Message(Message.GET, "pynapl_test_ns.x").send(inbuf)
+        Message(Message.GET, "pynapl_test[1:]").send(inbuf)
+        Message(Message.GET, "pynapl_no_such_name").send(inbuf)
+        Message(Message.SET, Codec.encode(APLArray.from_python(["pynapl_test_scalar", 5, 0]))).send(inbuf)
+        Message(Message.GET, "pynapl_test_scalar").send(inbuf)
+        Message(Message.STOP, "STOP").send(inbuf)
+        inbuf.seek(0)
+
+        Connection(inbuf, outbuf, signon=False).runUntilStop()
+        outbuf.seek(0)
+        replies = [Message.recv(outbuf) for _ in range(9)]
+        self.assertEqual([Message.OK] * 4 + [Message.EVALRET] * 2 + [Message.ERR, Message.OK, Message.EVALRET],
+                         [msg.type for msg in replies])
+        self.assertEqual(42, Codec.decode(replies[4].data).to_python())
+        self.assertEqual([2, 3], Codec.decode(replies[5].data).to_python())
+        self.assertEqual(5, Codec.decode(replies[8].data).to_python())
+
+        # the raw value is kept as an APLArray
+        scope = sys.modules[PyEvaluator.__module__]
+        self.assertEqual([1, 2, 3], scope.pynapl_test)
+        self.assertTrue(isinstance(scope.pynapl_test_raw, APLArray))
+        self.assertEqual(([], [5]), (scope.pynapl_test_scalar.rho, list(scope.pynapl_test_scalar.data)))
+
+    def test_run_until_stop(self):
+        """The receive loop should answer messages as they come in, and end on STOP"""
+        inbuf, outbuf = BufferIO(), BufferIO()
+        Message(Message.REPR, "6*7").send(inbuf)
+        Message(Message.STOP, "STOP").send(inbuf)
+        inbuf.seek(0)
+
+        Connection(inbuf, outbuf, signon=False).runUntilStop()
+        outbuf.seek(0)
+        msg = Message.recv(outbuf)
+        self.assertEqual((Message.REPRRET, b"42"), (msg.type, msg.data))
+        self.assertEqual(Message.STOP, Message.recv(outbuf).type)
+
+@unittest.skipIf(os.name != 'posix', "prebuilt workspaces are for Unix")
+class TestRunDyalog(unittest.TestCase):
+    def test_fifo_peer_gone(self):
+        """Reading from a FIFO whose writer has gone for good should stop"""
+        fifo = IPC.FIFO()
+        try:
+            writer = threading.Thread(target=lambda: open(fifo.name, 'wb').write(b'ab'))
+            writer.start()
+            fifo.openRead()
+            writer.join()
+            fifo.peerExited = lambda: True
+            self.assertRaises(EOFError, fifo.read, 3)
+        finally:
+            fifo.close()
+            os.unlink(fifo.name)
+
+    def test_exit_at_startup(self):
+        """An interpreter that exits before it connects should not be waited for"""
+        for options in [{}, {'unixSocket': True}, {'forceTCP': True}]:
+            with self.assertRaises(InterpreterExited) as cm:
+                APL.APL(dyalog='/bin/false', **options)
+            self.assertEqual(1, cm.exception.returncode)
+
+    def test_build_workspace(self):
+        """A workspace should be built once, and then be used from the cache"""
+        cachedir = tempfile.mkdtemp()
+        try:
+            # a stand-in for Dyalog that saves an empty workspace, and
+            # keeps track of how often it was run
+            bindir = tempfile.mkdtemp(dir=cachedir)
+            dyalog = os.path.join(bindir, 'dyalog')
+            with open(dyalog, 'w') as f:
+                f.write("#!/bin/sh\necho >>%s/runs\nsed -n 's/^ *)SAVE //p' | xargs touch\n" % bindir)
+            os.chmod(dyalog, 0o755)
+
+            path = RunDyalog.build_workspace(dyalog, cachedir)
+            self.assertTrue(os.path.exists(path))
+            self.assertEqual(path, RunDyalog.build_workspace(dyalog, cachedir))
+            with open(os.path.join(bindir, 'runs')) as f:
+                self.assertEqual(1, len(f.readlines()))
+            self.assertEqual(sorted([os.path.basename(path), os.path.basename(bindir)]),
+                             sorted(os.listdir(cachedir)))
+        finally:
+            shutil.rmtree(cachedir)
 
 class TestAPL(unittest.TestCase):
     def setUp(self):
@@ -137,3 +630,18 @@ class TestAPL(unittest.TestCase):
         
 
 
+
+class TestAPLPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = APL.APLPool(2)
+    def tearDown(self):
+        self.pool.stop()
+
+    def test_map(self):
+        """A function mapped over the pool should give the results in order"""
+        self.pool.fix(":Namespace Sq\n  sq←{⍵*2}\n:EndNamespace")
+        self.assertEqual([n*n for n in range(50)], self.pool.map("Sq.sq", range(50), chunksize=3))
+        self.assertEqual(49, self.pool.fn("Sq.sq")(7))
+        self.assertEqual([1, 4, 9], self.pool.map(self.pool.fn("Sq.sq"), [1, 2, 3]))
+        self.assertRaises(TypeError, self.pool.map, len, [1, 2, 3])
+        self.assertEqual([0, 0], self.pool.load)
@@ -7,10 +7,14 @@ from __future__ import unicode_literals
 from ..Array import *
 from ..Util import *
 from .. import APL
+from .. import Codec
 
 import unittest
 import random
 import sys
+import os
+import tempfile
+import struct
 
 if sys.version_info.major >= 3:
     # have a known generator in both versions w/o affecting anything else
@@ -75,6 +79,20 @@ class TestArrayAPL(unittest.TestCase):
         identity = self.apl.fn("⊢", raw=True)
         self.assertEqual(self.cplx_arr, identity(self.cplx_arr))
 
+    def test_packed_round_trip_apl(self):
+        """Large simple arrays should be packed both ways, and come back as they were"""
+        n = Codec.PACK_MIN * 2
+        arrs = [APLArray.from_python(list(range(-n, n))),
+                APLArray.from_python([x / 3 for x in range(n)]),
+                APLArray.from_python("€" * n),
+                APLArray(rho=[2, n], data=[x % 2 for x in range(2 * n)])]
+        identity = self.apl.fn("⊢", raw=True)
+        for arr in arrs:
+            self.assertEqual(arr, identity(arr))
+        # and packed arrays made in APL should come back too
+        self.assertEqual(list(range(n)), self.apl.eval("⎕IO-⍨⍳%d" % n))
+        self.assertEqual([[1, 0] * n], self.apl.eval("1 %d⍴1 0" % (2 * n)))
+
 
 class TestArraySerializer(unittest.TestCase):
     def setUp(self):
@@ -87,6 +105,77 @@ class TestArraySerializer(unittest.TestCase):
                 APLArray.fromJSONString(self.cplx_arr.toJSONString()))
         
 
+class TestCodec(unittest.TestCase):
+    def test_packed_round_trip(self):
+        """Large simple arrays should be packed, and come back unchanged."""
+        n = Codec.PACK_MIN * 2
+        for data in ([random.randint(-100,100) for _ in xrange(n)],
+                     [random.randint(-10**9,10**9) for _ in xrange(n)],
+                     [random.random() for _ in xrange(n)],
+                     [complex(random.random(), random.random()) for _ in xrange(n)],
+                     list("Quack\u2373\u2375" * n)[:n]):
+            arr = APLArray(rho=[n//2, 2], data=data)
+            body = Codec.encode(arr)
+            self.assertEqual(b'\x00', body[:1])
+            self.assertEqual(arr, Codec.decode(body))
+
+    def test_surrogates(self):
+        """Surrogates in a two-byte character array are separate characters"""
+        n = Codec.PACK_MIN
+        chars = "\ud83d\ude00" * (n//2)
+        blob = struct.pack('<BBQ', Codec.CHAR16, 1, n) + chars.encode('utf-16-le', 'surrogatepass')
+        arr = Codec.unpack(Codec.ChunkReader([blob]))
+        self.assertEqual([n], arr.rho)
+        self.assertEqual(list(chars), list(arr.data))
+
+    def test_nested(self):
+        """Packed arrays nested inside JSON should be decoded in place."""
+        arr = APLArray.from_python(["expr", [list(range(Codec.PACK_MIN)), "abc", 42]])
+        self.assertEqual(arr.to_python(), Codec.decode(Codec.encode(arr)).to_python())
+
+    def test_small_is_json(self):
+        """Small arrays should still be sent as JSON."""
+        arr = APLArray.from_python([1, 2, 3])
+        self.assertEqual(arr.toJSONString().encode('utf-8'), Codec.encode(arr))
+
+    def test_booleans(self):
+        """Boolean arrays should be sent as bits, or as positions if they are sparse"""
+        for ones, tag in ((500, Codec.BITS), (3, Codec.BITS_SPARSE), (997, Codec.BITS_SPARSE)):
+            data = [1]*ones + [0]*(1000-ones)
+            random.shuffle(data)
+            arr = APLArray(rho=[10, 100], data=data)
+            self.assertEqual(tag, Codec.element_type(arr))
+            self.assertEqual(data, list(Codec.decode(Codec.encode(arr)).data))
+
+    def test_strings(self):
+        """Character arrays should be sent as strings"""
+        arr = APLArray.from_python(["ab", "c", "", "xyz"])
+        self.assertEqual('{"r": [4], "d": ["ab", "c", "", "xyz"], "t": 1}', arr.toJSONString())
+        self.assertEqual(arr.to_python(), APLArray.fromJSONString(arr.toJSONString()).to_python())
+
+        mat = APLArray(rho=[2, 2], data="ab\u2373\u2375")
+        self.assertIn('"d": "ab\u2373\u2375"', mat.toJSONString())
+        self.assertEqual(["ab", "\u2373\u2375"], APLArray.fromJSONString(mat.toJSONString()).to_python())
+
+    def test_shared_file(self):
+        """Very large arrays should be passed in a file, which is removed afterwards."""
+        shm_dir, shm_min = Codec.SHM_DIR, Codec.SHM_MIN
+        Codec.SHM_DIR, Codec.SHM_MIN = tempfile.mkdtemp(), 1024
+        try:
+            arr = APLArray.from_python([list(range(1000)), "abc" * 100])
+            body = Codec.encode(arr)
+            self.assertEqual(b'\x01', body[:1])
+            self.assertEqual(1, len(os.listdir(Codec.SHM_DIR)))
+            self.assertEqual(arr.to_python(), Codec.decode(body).to_python())
+            self.assertEqual([], os.listdir(Codec.SHM_DIR))
+            # also if the message cannot be decoded
+            body = Codec.encode(arr)
+            self.assertRaises(ValueError, Codec.decode, body[:9] + b'\xff' + body[10:])
+            self.assertEqual([], os.listdir(Codec.SHM_DIR))
+        finally:
+            os.rmdir(Codec.SHM_DIR)
+            Codec.SHM_DIR, Codec.SHM_MIN = shm_dir, shm_min
+
 class TestArray(unittest.TestCase):
     def setUp(self):
         self.rarr = makeRandomArray()
@@ -100,6 +189,48 @@ class TestArray(unittest.TestCase):
         """↓ should drop the first element"""
         self.assertEqual(self.rarr.rho[:-1], self.rarr.split().rho)
 
+    def test_compact_storage(self):
+        """Simple arrays should be stored in typed buffers"""
+        arr = APLArray(rho=[3], data=[1.5, 2.5, 3.5])
+        self.assertFalse(hasattr(arr, '__dict__'))
+        self.assertEqual('d', arr.data.typecode)
+        self.assertEqual("abc", APLArray.from_python("abc").to_python())
+
+        # assigning something that does not fit must still work
+        arr[1] = "x"
+        self.assertEqual([1.5, "x", 3.5], arr.to_python())
+
+    @unittest.skipUnless(NUMPY_SUPPORT, "NumPy is not available")
+    def test_numpy(self):
+        """NumPy arrays should convert in C order and keep their shape"""
+        nparr = np.arange(24).reshape(2, 3, 4)
+        arr = APLArray.from_python(nparr)
+        self.assertEqual([2, 3, 4], arr.rho)
+        self.assertEqual(list(range(24)), list(arr.data))
+        self.assertTrue((nparr == arr.to_numpy()).all())
+        self.assertEqual(nparr.tolist(), arr.to_python())
+
+    def test_lazy(self):
+        """A lazily converted array should equal the eagerly converted one"""
+        arr = APLArray(rho=[2, 3, 4], data=list(range(24)))
+        lazy = arr.to_python(lazy=True)
+        self.assertIsInstance(lazy, LazyList)
+        self.assertEqual(2, len(lazy))
+        self.assertEqual(arr.to_python(), lazy)
+        self.assertEqual(lazy.tolist(), lazy)
+        self.assertEqual([20, 21, 22, 23], lazy[-1][-1])
+        self.assertIs(arr, APLArray.from_python(lazy))
+
+        # arrays nested inside are lazy too
+        nested = APLArray.from_python([1, [[2, 3], [4, 5]], "ab"]).to_python(lazy=True)
+        self.assertIsInstance(nested[1], LazyList)
+        self.assertEqual([2, 3], nested[1][0])
+        self.assertEqual([1, [[2, 3], [4, 5]], "ab"], nested)
+
+        # empty axes should still give the right structure
+        self.assertEqual([[], []], APLArray(rho=[2, 0, 3], data=[]).to_python())
+        self.assertEqual(["ab", "cd"], APLArray.from_python(["ab", "cd"]).to_python(lazy=True))
+
 class TestConversion(unittest.TestCase):
     def setUp(self):
         self.apl = APL.APL()